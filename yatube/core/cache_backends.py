@@ -0,0 +1,142 @@
+"""Бэкенды кэша с метриками попаданий и сжатием больших значений.
+
+``SharedFileBasedCache`` — общий для всех процессов кэш в каталоге на
+диске: инвалидация версиями лент и фрагменты страниц работают сразу для
+всех воркеров. ``InstrumentedLocMemCache`` — замена для разработки и
+тестов, кэш в памяти одного процесса.
+
+Счётчики попаданий и промахов ведутся в памяти процесса: каждый воркер
+отдаёт на странице здоровья кэша только свою статистику.
+"""
+import fcntl
+import os
+import pickle
+import re
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+_MISSING = object()
+_PREFIX = re.compile(r'[^:.|]*')
+
+# Django создаёт экземпляр бэкенда на поток, поэтому счётчики общие.
+_stats = defaultdict(lambda: [0, 0])
+_stats_lock = Lock()
+
+
+def key_prefix(key):
+    """Пространство имён ключа: часть до первого «:», «.» или «|»."""
+    return _PREFIX.match(key).group() or key
+
+
+def stats():
+    """Попадания и промахи по пространствам имён в этом процессе."""
+    with _stats_lock:
+        return {prefix: tuple(counts) for prefix, counts in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class Compressed(bytes):
+    """Сжатое значение в кэше: pickle, затем zlib."""
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи кэша для метрик запроса."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        hit = value is not _MISSING
+        metrics.add_cache_access(hit)
+        with _stats_lock:
+            _stats[key_prefix(key)][0 if hit else 1] += 1
+        return default if value is _MISSING else value
+
+
+class CompressedCacheMixin:
+    """Сжимает значения длиннее COMPRESS_MIN_LENGTH байт в pickle.
+
+    Числа не трогаются, чтобы работали incr и decr.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.compress_min_length = params.get('OPTIONS', {}).get(
+            'COMPRESS_MIN_LENGTH', 1024)
+
+    def _pack(self, value):
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) < self.compress_min_length:
+            return value
+        return Compressed(zlib.compress(data))
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, default, version)
+        if isinstance(value, Compressed):
+            return pickle.loads(zlib.decompress(value))
+        return value
+
+    def set(self, key, value, timeout=None, version=None):
+        super().set(key, self._pack(value), timeout, version)
+
+    def add(self, key, value, timeout=None, version=None):
+        return super().add(key, self._pack(value), timeout, version)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, CompressedCacheMixin,
+                              LocMemCache):
+    pass
+
+
+class SharedFileBasedCache(InstrumentedCacheMixin, FileBasedCache):
+    """Файловый кэш с атомарными incr и add между процессами.
+
+    FileBasedCache и так сжимает каждую запись zlib.
+    """
+
+    @contextmanager
+    def _locked(self):
+        # Чтение-изменение-запись под flock: иначе два воркера, одновременно
+        # увеличивающие версию ленты, получат одно и то же число.
+        self._createdir()
+        with open(os.path.join(self._dir, 'update.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=None, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # BaseCache.incr перезаписывает ключ с TIMEOUT по умолчанию, и
+        # версии лент без срока истекали бы через пять минут простоя.
+        # Новое значение пишется с прежним сроком жизни записи.
+        with self._locked():
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except FileNotFoundError:
+                expiry, value = 0, None
+            now = time.time()
+            if expiry is not None and expiry < now:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            self.set(key, value,
+                     None if expiry is None else expiry - now, version)
+            return value
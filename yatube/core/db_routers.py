@@ -0,0 +1,80 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики перечислены в ``settings.DATABASE_REPLICAS``. После записи
+запросы клиента несколько секунд читают из основной базы, чтобы автор
+сразу видел свой пост или комментарий, пока реплика догоняет.
+
+С реплик читают только запросы внутри ``use_primary(False)``, который
+ставит PrimaryPinMiddleware. Команды, фоновые потоки и middleware
+снаружи него работают с основной базой, а их записи не оставляют
+закрепления в контексте потока. Чтения, результат которых ложится в
+общий кэш надолго, тоже идут в основную базу: отстающая реплика иначе
+закэшировала бы данные до записи под уже новой версией.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+_scoped = ContextVar('primary_scope', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+_written = ContextVar('written_to_primary', default=False)
+
+
+def pinned():
+    return _pinned.get()
+
+
+def written():
+    """Была ли запись в основную базу внутри ``use_primary``."""
+    return _written.get()
+
+
+def pin():
+    """Переводит остаток запроса на основную базу без cookie."""
+    if _scoped.get():
+        _pinned.set(True)
+
+
+@contextmanager
+def use_primary(value=True):
+    scoped_token = _scoped.set(True)
+    pinned_token = _pinned.set(value)
+    written_token = _written.set(False)
+    try:
+        yield
+    finally:
+        _scoped.reset(scoped_token)
+        _pinned.reset(pinned_token)
+        _written.reset(written_token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        # Внутри транзакции читаем то, что она уже записала.
+        if (not replicas or not _scoped.get() or pinned()
+                or connections[PRIMARY].in_atomic_block):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if _scoped.get():
+            # Дальше в этом запросе читаем своё же из основной базы.
+            _pinned.set(True)
+            _written.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с данными из основной базы.
+        return db == PRIMARY
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from core.db_routers import PRIMARY
+from core.sqlite import copy_database
+from posts.models import Comment, Post, User
+
+# Настройки SQLite «из коробки» для сравнения.
+STOCK_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'busy_timeout': 5000,
+    'temp_store': 'DEFAULT',
+}
+
+
+def worker(path, pragmas, seconds, write_ratio, seed, post_ids, user_ids,
+           results):
+    # Процесс получен через fork: своё соединение к копии базы.
+    connections.close_all()
+    connections[PRIMARY].settings_dict['NAME'] = path
+    settings.SQLITE_PRAGMAS = pragmas
+    rng = random.Random(seed)
+    reads = writes = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                # Та же запись, что делает add_comment.
+                post_id = rng.choice(post_ids)
+                with transaction.atomic():
+                    Comment.objects.create(
+                        post_id=post_id, author_id=rng.choice(user_ids),
+                        text='benchmark')
+                    Post.objects.filter(pk=post_id).update(
+                        comments_count=F('comments_count') + 1)
+                writes += 1
+            else:
+                list(Post.objects.select_related('author', 'group')[
+                    :settings.COUNT_POST])
+                reads += 1
+        except OperationalError:
+            errors += 1
+    connections.close_all()
+    results.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite с настройками по '
+            'умолчанию и с SQLITE_PRAGMAS: несколько процессов '
+            'одновременно читают ленту и пишут комментарии в копию базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля операций записи.')
+
+    def handle(self, *args, workers, seconds, write_ratio, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на SQLite.')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:10000])
+        user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+        if not post_ids or not user_ids:
+            raise CommandError(
+                'Нет данных: сначала запустите generate_dataset.')
+        results = {}
+        for name, pragmas in (('stock', STOCK_PRAGMAS),
+                              ('tuned', settings.SQLITE_PRAGMAS)):
+            with tempfile.TemporaryDirectory(
+                    dir=os.path.dirname(primary.settings_dict['NAME'])
+            ) as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                copy_database(primary, path, pragmas['journal_mode'])
+                results[name] = self.run(
+                    path, pragmas, workers, seconds, write_ratio,
+                    post_ids, user_ids)
+            reads, writes, errors = results[name]
+            self.stdout.write(
+                f'{name:>6}: чтений {reads / seconds:8.0f}/с, '
+                f'записей {writes / seconds:7.0f}/с, '
+                f'ошибок блокировки {errors}')
+        stock, tuned = results['stock'], results['tuned']
+        for label, index in (('чтения', 0), ('записи', 1)):
+            if stock[index]:
+                self.stdout.write(
+                    f'Ускорение {label}: {tuned[index] / stock[index]:.2f}x')
+
+    def run(self, path, pragmas, workers, seconds, write_ratio, post_ids,
+            user_ids):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=worker, args=(
+                path, pragmas, seconds, write_ratio, seed, post_ids,
+                user_ids, queue))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [0, 0, 0]
+        for _ in processes:
+            for index, value in enumerate(queue.get()):
+                totals[index] += value
+        for process in processes:
+            process.join()
+        return tuple(totals)
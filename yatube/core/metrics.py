@@ -0,0 +1,72 @@
+"""Счётчики стоимости текущего запроса.
+
+Состояние хранится в contextvar, поэтому обновлять его из обёртки SQL,
+бэкенда шаблонов и бэкенда кэша можно без доступа к объекту запроса.
+Вне запроса (команды, shell) счётчики не ведутся.
+"""
+from contextvars import ContextVar
+from time import perf_counter
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'template_time',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Подключается через connection.execute_wrapper.
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+
+    @property
+    def total_time(self):
+        return perf_counter() - self.started
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses", '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def add_template_time(seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.template_time += seconds
+
+
+def add_cache_access(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
@@ -0,0 +1,87 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_routers, metrics, nplusone
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class RequestMetricsMiddleware:
+    """Добавляет заголовок Server-Timing и логирует медленные запросы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_METRICS_SLOW_MS
+        self.max_queries = settings.REQUEST_METRICS_MAX_QUERIES
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        response['Server-Timing'] = request_metrics.server_timing()
+        total_ms = request_metrics.total_time * 1000
+        if (total_ms > self.slow_ms
+                or request_metrics.queries > self.max_queries):
+            logger.warning(
+                'Медленный запрос %s %s: %.1f мс, SQL: %d за %.1f мс, '
+                'шаблоны: %.1f мс',
+                request.method, request.path, total_ms,
+                request_metrics.queries, request_metrics.db_time * 1000,
+                request_metrics.template_time * 1000)
+        return response
+
+
+class PrimaryPinMiddleware:
+    """Read-your-writes: после записи клиент читает из основной базы.
+
+    Запрос, записавший что-то в базу, ставит короткоживущую cookie,
+    и пока она жива, все чтения этого клиента идут мимо реплик.
+    Изменяющие запросы (POST и т. п.) читают из основной базы всегда.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = settings.REPLICA_PIN_SECONDS
+
+    def __call__(self, request):
+        with db_routers.use_primary(
+                PIN_COOKIE in request.COOKIES
+                or request.method not in SAFE_METHODS):
+            response = self.get_response(request)
+            written = db_routers.written()
+        if written:
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 в запросах: в DEBUG пишет в лог, в тестах падает."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.NPLUSONE_DETECT:
+            return self.get_response(request)
+        with nplusone.detect() as shapes:
+            response = self.get_response(request)
+        repeated = shapes.repeated(settings.NPLUSONE_THRESHOLD)
+        if repeated:
+            message = nplusone.describe(request.path, repeated)
+            if settings.NPLUSONE_RAISE:
+                raise nplusone.NPlusOneError(message)
+            logger.warning(message)
+        return response
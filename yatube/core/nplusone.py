@@ -0,0 +1,62 @@
+"""Поиск N+1: повторяющиеся SELECT одной формы в пределах запроса.
+
+Форма запроса — SQL без параметров, в котором списки ``IN (%s, ...)``
+свёрнуты, поэтому выборки «по одной строке на объект» в цикле
+шаблона или представления складываются в один счётчик.
+"""
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def shape(sql):
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryShapes:
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            self.counts[shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.counts.most_common()
+                if count >= threshold]
+
+
+@contextmanager
+def detect():
+    """Считает формы SELECT-запросов всех подключений внутри блока."""
+    shapes = QueryShapes()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(shapes))
+        yield shapes
+
+
+@contextmanager
+def forbid(path='<блок>'):
+    """Падает, если внутри блока нашёлся N+1; годится и для unittest."""
+    with detect() as shapes:
+        yield shapes
+    repeated = shapes.repeated(settings.NPLUSONE_THRESHOLD)
+    if repeated:
+        raise NPlusOneError(describe(path, repeated))
+
+
+def describe(path, repeated):
+    lines = [f'Возможный N+1 в {path}:']
+    lines += [f'  {count} раз: {sql}' for sql, count in repeated]
+    return '\n'.join(lines)
@@ -0,0 +1,53 @@
+"""Общие фикстуры pytest для tests/ и тестов приложений.
+
+Подключаются из корневого conftest.py. Любой запрос через тестовый
+клиент с N+1 роняет тест; для осознанных исключений есть метка
+``@pytest.mark.allow_nplusone``. Кэш очищается перед каждым тестом:
+после отката транзакции id пользователей и постов достаются новым
+объектам, и старые записи кэша выдавали бы их за прежние. Миниатюры
+рендерятся не в фоне, а в конце теста, до разбора фикстур: поток пула
+упирался бы в блокировки общей базы в памяти и писал бы во временный
+MEDIA_ROOT, который фикстура уже удаляет.
+"""
+import pytest
+from django.core.cache import cache
+
+from core import nplusone
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'allow_nplusone: не проверять тест на N+1')
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _deferred_thumbnails(settings):
+    settings.POST_THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def _nplusone_guard(request, settings):
+    if request.node.get_closest_marker('allow_nplusone'):
+        settings.NPLUSONE_DETECT = False
+        return
+    settings.NPLUSONE_DETECT = True
+    settings.NPLUSONE_RAISE = True
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item):
+    # sorl-thumbnail читает настройки при импорте, поэтому импорт здесь.
+    from posts import thumbnails
+    thumbnails.join()
+    yield
+
+
+@pytest.fixture
+def assert_no_nplusone():
+    """Проверка кода вне HTTP-запроса: ``with assert_no_nplusone(): ...``."""
+    return nplusone.forbid
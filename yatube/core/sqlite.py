@@ -0,0 +1,37 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+PRAGMA из ``settings.SQLITE_PRAGMAS`` выполняются при каждом новом
+соединении. WAL позволяет читать во время записи, ``synchronous=NORMAL``
+в WAL не теряет целостность и убирает fsync на каждый коммит, а
+``busy_timeout`` заставляет писателя подождать блокировку, а не
+сразу падать с «database is locked».
+"""
+import sqlite3
+
+from django.conf import settings
+
+
+def apply_pragmas(connection, pragmas):
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+
+
+def copy_database(connection, path, journal_mode):
+    """Копия базы SQLite в файл ``path`` для бенчмарков.
+
+    Режим журнала переключается здесь один раз: при смене из рабочих
+    процессов он требует монопольной блокировки.
+    """
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+        target.execute(f'PRAGMA journal_mode = {journal_mode}')
+    finally:
+        target.close()
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def allow_nplusone():
+    """Декоратор теста без проверки на N+1, как метка ``allow_nplusone``."""
+    return override_settings(NPLUSONE_DETECT=False)
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """``manage.py test`` с поиском N+1: находка роняет тест."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_DETECT = True
+        settings.NPLUSONE_RAISE = True
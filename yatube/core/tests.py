@@ -0,0 +1,295 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import feed_cache, group_pages
+from posts.models import Group, Post
+
+from . import cache_backends, nplusone
+from .db_routers import ReplicaRouter, pinned, use_primary
+from .middleware import PIN_COOKIE
+from .test_runner import allow_nplusone
+
+User = get_user_model()
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def test_server_timing_header(self):
+        """Ответ содержит Server-Timing с числом SQL-запросов."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:posts_index'))
+        server_timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', server_timing)
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, server_timing)
+
+    @override_settings(REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_request_logged(self):
+        """Запрос дольше порога попадает в лог."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('about:author'))
+        self.assertIn('/about/author/', logs.output[0])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica_until_write(self):
+        """Чтение идёт с реплики, после записи — из основной базы."""
+        router = ReplicaRouter()
+        with use_primary(False):
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertEqual(router.db_for_read(Post), 'default')
+        with use_primary(True):
+            self.assertEqual(router.db_for_read(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_write_outside_scope_does_not_pin(self):
+        """Вне use_primary — основная база, и запись не закрепляет поток."""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        router.db_for_write(Post)
+        self.assertFalse(pinned())
+        with use_primary(False):
+            self.assertEqual(router.db_for_read(Post), 'replica')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaFilesTests(TransactionTestCase):
+    """Основная база и реплика в отдельном файле SQLite."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.ensure_defaults('replica')
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=self.user, text='Скопирован')
+        call_command('sync_replicas', stdout=StringIO())
+        Post.objects.create(author=self.user, text='Только в основной')
+
+    def test_reads_from_replica_file(self):
+        """До записи запрос читает из файла реплики, после — из основной."""
+        self.assertEqual(Post.objects.count(), 2)
+        with use_primary(False):
+            self.assertEqual(Post.objects.count(), 1)
+            Post.objects.create(author=self.user, text='Новый')
+            self.assertEqual(Post.objects.count(), 3)
+        with use_primary(False):
+            self.assertEqual(Post.objects.count(), 1)
+
+    def test_pin_cookie_reads_primary(self):
+        """После записи через сайт клиент читает из основной базы."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Через форму'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        url = reverse('posts:post_detail', args=(
+            Post.objects.get(text='Через форму').pk,))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(Client().get(url).status_code, 404)
+
+    def test_changed_feed_page_reads_primary(self):
+        """Страницу под только что сменённой версией строит основная база."""
+        cache.clear()
+        feed_cache.bump({feed_cache.INDEX})
+        url = reverse('posts:posts_index')
+        self.assertEqual(len(Client().get(url).context['page_obj']), 2)
+        # Чтения вернулись на реплику, а фрагмент под новой версией
+        # остался собранным из основной базы.
+        cache.delete(feed_cache._changed_key(feed_cache.INDEX))
+        with use_primary(False):
+            self.assertEqual(Post.objects.count(), 1)
+        self.assertContains(Client().get(url), 'Только в основной')
+
+    def test_group_pages_cached_from_primary(self):
+        """Группа и список её постов попадают в кэш из основной базы."""
+        cache.clear()
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Post.objects.create(author=self.user, text='В группе', group=group)
+        with use_primary(False):
+            self.assertFalse(Group.objects.exists())
+            self.assertEqual(group_pages.get_group('group'), group)
+            self.assertEqual(group_pages._entry(group.pk)['count'], 1)
+
+
+class PrimaryPinMiddlewareTests(TestCase):
+    def test_write_sets_pin_cookie(self):
+        """После записи клиент получает cookie чтения из основной базы."""
+        user = User.objects.create_user(username='auth')
+        self.client.force_login(user)
+        response = self.client.get(reverse('posts:posts_index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertTrue(Post.objects.filter(text='Пост').exists())
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class NPlusOneTests(TestCase):
+    def test_enabled_in_tests(self):
+        """Тесты любым раннером падают на N+1."""
+        self.assertTrue(settings.NPLUSONE_DETECT)
+        self.assertTrue(settings.NPLUSONE_RAISE)
+
+    @allow_nplusone()
+    def test_allow_nplusone(self):
+        """Декоратор отключает проверку для одного теста."""
+        self.assertFalse(settings.NPLUSONE_DETECT)
+
+    def test_repeated_queries_detected(self):
+        """Одинаковые выборки в цикле считаются N+1."""
+        user = User.objects.create_user(username='auth')
+        with self.assertRaises(nplusone.NPlusOneError):
+            with nplusone.forbid():
+                for _ in range(3):
+                    User.objects.get(pk=user.pk)
+        with nplusone.forbid():
+            list(User.objects.filter(pk__in=[user.pk]))
+
+    def test_in_lists_share_shape(self):
+        """Списки IN разной длины дают одну форму запроса."""
+        self.assertEqual(
+            nplusone.shape('SELECT 1 WHERE id IN (%s)'),
+            nplusone.shape('SELECT 1 WHERE id IN (%s, %s, %s)'))
+
+    @override_settings(NPLUSONE_DETECT=True, NPLUSONE_RAISE=False)
+    def test_middleware_logs_in_debug(self):
+        """Без флага падения находки уходят в лог."""
+        user = User.objects.create_user(username='auth')
+        for index in range(3):
+            Post.objects.create(author=user, text=f'Пост {index}')
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            with override_settings(NPLUSONE_THRESHOLD=1):
+                self.client.get(reverse('posts:posts_index'))
+        self.assertIn('Возможный N+1 в /', logs.output[0])
+
+
+class CacheBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_backends.reset_stats()
+
+    def test_large_values_compressed(self):
+        """Большие значения хранятся сжатыми, мелкие и числа — как есть."""
+        text = 'Пост ' * 1000
+        cache.set('page:big', text)
+        cache.set('page:counter', 1)
+        self.assertIsInstance(
+            LocMemCache.get(cache, 'page:big'), cache_backends.Compressed)
+        self.assertEqual(cache.get('page:big'), text)
+        self.assertEqual(cache.incr('page:counter'), 2)
+
+    def test_file_cache_shared_between_workers(self):
+        """Файловый кэш виден из разных экземпляров бэкенда."""
+        with tempfile.TemporaryDirectory() as location:
+            first = cache_backends.SharedFileBasedCache(location, {})
+            second = cache_backends.SharedFileBasedCache(location, {})
+            first.set('feed_version:index', 5)
+            second.incr('feed_version:index')
+            self.assertEqual(first.get('feed_version:index'), 6)
+
+    def test_file_cache_incr_atomic(self):
+        """Одновременные incr из разных воркеров не теряют приращений."""
+        with tempfile.TemporaryDirectory() as location:
+            cache_backends.SharedFileBasedCache(location, {}).set('counter', 0)
+
+            def worker():
+                backend = cache_backends.SharedFileBasedCache(location, {})
+                for _ in range(25):
+                    backend.incr('counter')
+
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(
+                cache_backends.SharedFileBasedCache(location, {}).get(
+                    'counter'), 100)
+
+    def test_file_cache_incr_keeps_expiry(self):
+        """incr не назначает вечному ключу срок жизни по умолчанию."""
+        with tempfile.TemporaryDirectory() as location:
+            backend = cache_backends.SharedFileBasedCache(
+                location, {'TIMEOUT': 1})
+            backend.set('feed_version:index', 5, None)
+            backend.set('counter', 5)
+            backend.incr('feed_version:index')
+            backend.incr('counter')
+            with mock.patch('time.time', return_value=time.time() + 2):
+                self.assertEqual(backend.get('feed_version:index'), 6)
+                self.assertIsNone(backend.get('counter'))
+                with self.assertRaises(ValueError):
+                    backend.incr('counter')
+
+    def test_health_view_reports_prefixes(self):
+        """Страница здоровья кэша показывает долю попаданий по префиксам."""
+        url = reverse('cache_health')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        cache.get('health_test:key')
+        cache.set('health_test:key', 1)
+        cache.get('health_test:key')
+        self.client.force_login(User.objects.create_user(
+            username='admin', is_staff=True))
+        data = self.client.get(url).json()
+        self.assertTrue(data['healthy'])
+        self.assertEqual(data['stats_scope'], 'process')
+        self.assertEqual(data['prefixes']['health_test'], {
+            'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+
+class SQLitePragmasTests(TransactionTestCase):
+    def test_pragmas_applied(self):
+        """Соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        expected = {'busy_timeout': 5000, 'cache_size': -65536,
+                    'synchronous': 1, 'temp_store': 2}
+        with connection.cursor() as cursor:
+            for name, value in expected.items():
+                cursor.execute(f'PRAGMA {name}')
+                with self.subTest(pragma=name):
+                    self.assertEqual(cursor.fetchone()[0], value)
+
+    def test_benchmark_concurrency(self):
+        """Бенчмарк сравнивает обе конфигурации на копии базы."""
+        user = User.objects.create_user(username='bench')
+        Post.objects.create(text='Пост', author=user)
+        out = StringIO()
+        call_command('benchmark_concurrency', workers=2, seconds=0.2,
+                     stdout=out)
+        self.assertIn('stock:', out.getvalue())
+        self.assertIn('tuned:', out.getvalue())
+        self.assertEqual(Post.objects.get().comments_count, 0)
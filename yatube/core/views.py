@@ -1,5 +1,14 @@
+import os
+import time
+import uuid
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache, caches
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import cache_backends
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +24,36 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def cache_health(request):
+    """Доступность кэша и доля попаданий по пространствам имён ключей.
+
+    Попадания и промахи считаются в процессе, ответившем на запрос.
+    """
+    probe = uuid.uuid4().hex
+    started = time.perf_counter()
+    try:
+        cache.set('health:probe', probe, 10)
+        healthy = cache.get('health:probe') == probe
+    except Exception as error:
+        healthy, error_text = False, str(error)
+    else:
+        error_text = None
+    prefixes = {}
+    for prefix, (hits, misses) in sorted(cache_backends.stats().items()):
+        prefixes[prefix] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3),
+        }
+    return JsonResponse({
+        'backend': type(caches['default']).__name__,
+        'healthy': healthy,
+        'error': error_text,
+        'roundtrip_ms': round((time.perf_counter() - started) * 1000, 2),
+        'stats_scope': 'process',
+        'pid': os.getpid(),
+        'prefixes': prefixes,
+    }, status=200 if healthy else 503)
@@ -0,0 +1,235 @@
+"""Отложенная запись комментариев (write-behind).
+
+При ``COMMENT_WRITE_BEHIND`` представление add_comment проверяет форму
+и дописывает комментарий строкой NDJSON в журнал на диске вместо
+отдельной транзакции в базе. Фоновый поток раз в
+``COMMENT_BATCH_SECONDS`` или по накоплении ``COMMENT_BATCH_SIZE``
+записей забирает журнал и сохраняет пачку одним bulk_create вместе со
+счётчиками и рейтингом. Пока комментарий ждёт в очереди, автор видит
+его на странице поста: запись лежит в кэше под ключом автора и поста.
+Подмешивание работает только с общим кэшем: с кэшем в памяти процесса
+запись увидел бы лишь воркер, принявший комментарий, и он же показывал
+бы её после сохранения другим воркером.
+
+Журнал общий для всех процессов и переживает перезапуск: незабранные
+пачки сохранит следующий сброс или команда ``flush_comments``.
+Повторная обработка пачки после сбоя не создаёт дублей.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.backends import shared_cache
+
+from . import counters, feed_cache, trending
+from .models import Comment, Post
+from .utils import manual_dates
+
+logger = logging.getLogger(__name__)
+
+JOURNAL = 'journal.ndjson'
+BATCH_PREFIX = 'batch-'
+PENDING_TIMEOUT = 60 * 60 * 24
+
+_flusher = None
+_wakeup = threading.Event()
+_queued = 0
+_lock = threading.Lock()
+
+
+def _path(name):
+    return os.path.join(settings.COMMENT_QUEUE_DIR, name)
+
+
+@contextmanager
+def _file_lock(name, blocking=True):
+    """Блокировка flock на файле в каталоге очереди, общая для процессов."""
+    os.makedirs(settings.COMMENT_QUEUE_DIR, exist_ok=True)
+    with open(_path(name), 'a') as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def pending_key(post_id, author_id):
+    return f'pending_comments:{post_id}:{author_id}'
+
+
+def enqueue(comment):
+    """Ставит проверенный несохранённый комментарий в очередь."""
+    record = {
+        'id': uuid.uuid4().hex,
+        'post': comment.post_id,
+        'author': comment.author_id,
+        'text': comment.text,
+        'created': timezone.now().isoformat(),
+    }
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _file_lock('journal.lock'):
+        with open(_path(JOURNAL), 'a', encoding='utf-8') as journal:
+            journal.write(line)
+            journal.flush()
+            if settings.COMMENT_QUEUE_FSYNC:
+                os.fsync(journal.fileno())
+    if shared_cache():
+        key = pending_key(comment.post_id, comment.author_id)
+        cache.set(key, cache.get(key, []) + [record], PENDING_TIMEOUT)
+    _schedule()
+    return record
+
+
+def pending(post_id, user):
+    """Комментарии пользователя к посту, которые ещё ждут записи в базу."""
+    if not user.is_authenticated or not shared_cache():
+        return []
+    comments = [
+        Comment(post_id=post_id, author=user, text=record['text'],
+                created=parse_datetime(record['created']))
+        for record in cache.get(pending_key(post_id, user.pk), [])
+    ]
+    if not comments:
+        return []
+    # Запись могла уже попасть в базу, а ключ в кэше ещё не обновиться:
+    # сверяем так же, как _save, по посту, автору и времени.
+    saved = set(Comment.objects.filter(
+        post=post_id, author=user,
+        created__in=[comment.created for comment in comments],
+    ).values_list('created', flat=True))
+    return [comment for comment in comments if comment.created not in saved]
+
+
+def _schedule():
+    global _flusher, _queued
+    if settings.COMMENT_BATCH_SECONDS is None:
+        return
+    with _lock:
+        _queued += 1
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_run, name='comment-flusher', daemon=True)
+            _flusher.start()
+        if _queued >= settings.COMMENT_BATCH_SIZE:
+            _wakeup.set()
+
+
+def _run():
+    global _queued
+    while True:
+        _wakeup.wait(settings.COMMENT_BATCH_SECONDS)
+        _wakeup.clear()
+        with _lock:
+            _queued = 0
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось сохранить пачку комментариев')
+
+
+def flush(wait=False):
+    """Сохраняет всё накопленное в журнале; возвращает число комментариев.
+
+    Сбрасывает очередь один процесс за раз: без ``wait`` вызов сразу
+    возвращает 0, если сброс уже идёт в другом потоке или процессе.
+    """
+    with _file_lock('flush.lock', blocking=wait) as acquired:
+        if not acquired:
+            return 0
+        with _file_lock('journal.lock'):
+            if os.path.exists(_path(JOURNAL)):
+                os.rename(_path(JOURNAL),
+                          _path(f'{BATCH_PREFIX}{time.time_ns()}.ndjson'))
+        saved = 0
+        for name in sorted(os.listdir(settings.COMMENT_QUEUE_DIR)):
+            if name.startswith(BATCH_PREFIX):
+                saved += _save_file(_path(name))
+                os.remove(_path(name))
+        return saved
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as batch:
+        for line in batch:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Недописанная строка после аварийной остановки.
+                logger.warning('Пропущена повреждённая запись: %r', line)
+
+
+def _save_file(path):
+    records = _read(path)
+    saved = 0
+    while True:
+        chunk = list(islice(records, settings.COMMENT_BATCH_SIZE))
+        if not chunk:
+            return saved
+        saved += _save(chunk)
+
+
+def _save(records):
+    for record in records:
+        record['created'] = parse_datetime(record['created'])
+    with transaction.atomic():
+        posts = Post.objects.only('author', 'group').in_bulk(
+            {record['post'] for record in records})
+        # Пачку могли уже сохранить до сбоя, не успев удалить файл.
+        saved = set(Comment.objects.filter(
+            post__in=list(posts),
+            created__gte=min(record['created'] for record in records),
+            created__lte=max(record['created'] for record in records),
+        ).values_list('post_id', 'author_id', 'created'))
+        comments = [
+            Comment(post_id=record['post'], author_id=record['author'],
+                    text=record['text'], created=record['created'])
+            for record in records
+            if record['post'] in posts and (
+                record['post'], record['author'], record['created']
+            ) not in saved
+        ]
+        with manual_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments)
+        counters.comments_added(comments)
+        trending.refresh(Post.objects.filter(
+            pk__in={comment.post_id for comment in comments}))
+    feeds = set()
+    for post_id in {comment.post_id for comment in comments}:
+        feeds |= feed_cache.post_feeds(posts[post_id])
+    feed_cache.bump(feeds)
+    _forget(records)
+    return len(comments)
+
+
+def _forget(records):
+    """Убирает сохранённые записи из кэша ожидающих комментариев."""
+    if not shared_cache():
+        return
+    flushed = {}
+    for record in records:
+        key = pending_key(record['post'], record['author'])
+        flushed.setdefault(key, set()).add(record['id'])
+    for key, ids in flushed.items():
+        remaining = [record for record in cache.get(key, [])
+                     if record['id'] not in ids]
+        if remaining:
+            cache.set(key, remaining, PENDING_TIMEOUT)
+        else:
+            cache.delete(key)
@@ -0,0 +1,63 @@
+"""Денормализованные счётчики постов и комментариев.
+
+Функции вызываются из представлений внутри той же транзакции, что и
+изменение данных. Расхождения (правки через админку, shell, сбои)
+исправляет команда ``reconcile_counters``.
+"""
+from collections import Counter
+
+from django.db.models import F
+
+from .models import AuthorStats, Group, Post
+
+
+def _change(queryset, field, delta):
+    # Счётчик мог разойтись с данными, поэтому не уводим его ниже нуля.
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _change_author(user_id, delta):
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    _change(AuthorStats.objects.filter(user_id=user_id), 'posts_count', delta)
+
+
+def _change_group(group_id, delta):
+    if group_id:
+        _change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def post_created(post):
+    _change_author(post.author_id, 1)
+    _change_group(post.group_id, 1)
+
+
+def post_deleted(post):
+    _change_author(post.author_id, -1)
+    _change_group(post.group_id, -1)
+
+
+def posts_imported(posts):
+    """Счётчики для постов, созданных через bulk_create."""
+    for author_id, delta in Counter(post.author_id for post in posts).items():
+        _change_author(author_id, delta)
+    for group_id, delta in Counter(post.group_id for post in posts).items():
+        _change_group(group_id, delta)
+
+
+def post_moved(old_group_id, post):
+    if old_group_id != post.group_id:
+        _change_group(old_group_id, -1)
+        _change_group(post.group_id, 1)
+
+
+def comment_added(comment):
+    _change(Post.objects.filter(pk=comment.post_id), 'comments_count', 1)
+
+
+def comments_added(comments):
+    """Счётчики для комментариев, созданных через bulk_create."""
+    for post_id, delta in Counter(
+            comment.post_id for comment in comments).items():
+        _change(Post.objects.filter(pk=post_id), 'comments_count', delta)
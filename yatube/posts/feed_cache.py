@@ -0,0 +1,106 @@
+"""Версионирование кэша лент.
+
+У каждой ленты (главная, группа, автор) есть номер версии, который входит
+в ключ фрагментного кэша. Сохранение или удаление поста и новый
+комментарий увеличивают версии затронутых лент, поэтому старые фрагменты
+просто перестают читаться и кэш можно держать часами.
+
+Первые ``REPLICA_PIN_SECONDS`` после смены версии запросы страниц ленты
+читают основную базу: реплика могла ещё не догнать изменение, а
+фрагменты под новой версией кэшируются надолго.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import db_routers
+
+INDEX = 'index'
+
+
+def _key(feed):
+    return f'feed_version:{feed}'
+
+
+def _changed_key(feed):
+    return f'feed_changed:{feed}'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follows_feed(user_id):
+    """Подписки пользователя: от них зависят кнопки на страницах лент."""
+    return f'follows:{user_id}'
+
+
+def post_feeds(post, *extra_group_ids):
+    feeds = {INDEX, author_feed(post.author_id)}
+    for group_id in (post.group_id, *extra_group_ids):
+        if group_id:
+            feeds.add(group_feed(group_id))
+    return feeds
+
+
+def per_request(request, name, load):
+    """Значение, которое etag_func и представление считают раз за запрос."""
+    values = request.__dict__.setdefault('_feed_cache', {})
+    if name not in values:
+        values[name] = load()
+    return values[name]
+
+
+def version(feed, request=None):
+    """Версия ленты; с ``request`` — одна и та же на весь запрос.
+
+    Тогда ETag и ключи фрагментов страницы не разъедутся, даже если
+    версию увеличат посреди запроса.
+    """
+    if request is not None:
+        return per_request(
+            request, f'version:{feed}', lambda: _request_version(feed))
+    # Начальная версия — метка времени: если ключ версии вытеснен из кэша,
+    # новая версия не совпадёт ни с одной из уже закэшированных.
+    return cache.get_or_set(_key(feed), int(time.time() * 1000), None)
+
+
+def _request_version(feed):
+    values = cache.get_many((_key(feed), _changed_key(feed)))
+    if _changed_key(feed) in values:
+        db_routers.pin()
+    if _key(feed) in values:
+        return values[_key(feed)]
+    return version(feed)
+
+
+def bump(feeds):
+    feeds = set(feeds)
+    for feed in feeds:
+        try:
+            cache.incr(_key(feed))
+        except ValueError:
+            version(feed)
+    cache.set_many({_changed_key(feed): True for feed in feeds},
+                   settings.REPLICA_PIN_SECONDS)
+
+
+def etag(request, *feeds):
+    """ETag страницы ленты без обращения к постам и шаблонам.
+
+    Складывается из версий лент, версии подписок пользователя
+    и адреса страницы с параметрами.
+    """
+    parts = [str(version(feed, request)) for feed in feeds]
+    if request.user.is_authenticated:
+        parts += [str(request.user.pk),
+                  str(version(follows_feed(request.user.pk), request))]
+    parts.append(hashlib.md5(
+        request.get_full_path().encode()).hexdigest()[:12])
+    return '-'.join(parts)
@@ -0,0 +1,40 @@
+"""Выборки лент в том порядке, в каком их показывают представления.
+
+По этим же функциям команда explain_feeds проверяет планы запросов,
+поэтому проверяется ровно то, что выполняют страницы.
+"""
+from django.db.models import F
+
+from .models import Post
+
+# Лента подписок идёт по строкам Timeline: (user, pub_date, id) — ключ
+# индекса, и равные даты не требуют отдельной сортировки.
+FOLLOW_ORDER = {'field': 'followed_at', 'tiebreak': 'timeline_id'}
+
+
+def ordered(posts, field='pub_date', tiebreak='pk'):
+    """От новых к старым по (``field``, ``tiebreak``)."""
+    return posts.order_by(f'-{field}', f'-{tiebreak}')
+
+
+def index():
+    return ordered(Post.objects.all())
+
+
+def trending():
+    return Post.objects.order_by('-trending_score', '-pk')
+
+
+def group(group):
+    return ordered(group.posts.all())
+
+
+def profile(author):
+    return ordered(author.posts.all())
+
+
+def follow(user):
+    return ordered(Post.objects.filter(timelines__user=user).annotate(
+        followed_at=F('timelines__pub_date'),
+        timeline_id=F('timelines__pk'),
+    ), **FOLLOW_ORDER)
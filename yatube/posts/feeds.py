@@ -0,0 +1,162 @@
+"""RSS и Atom для главной, групп и авторов.
+
+Готовый ответ ленты кэшируется под версией из ``feed_cache``, поэтому
+новый, изменённый или удалённый пост сразу даёт новую ленту, а
+повторные опросы читалок получают 304 по ETag.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+class PostsFeed(Feed):
+    def items(self, obj):
+        return self.posts(obj).select_related('author', 'group')[
+            :settings.SYNDICATION_ITEMS]
+
+    def item_title(self, post):
+        return str(post)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=(post.pk,))
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return (post.group.title,) if post.group else ()
+
+
+class IndexFeed(PostsFeed):
+    title = 'Yatube: последние записи'
+    description = 'Новые записи всех авторов'
+
+    def link(self):
+        return reverse('posts:posts_index')
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def posts(self, group):
+        return group.posts.all()
+
+
+class AuthorFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: записи {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return self.title(author)
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def posts(self, author):
+        return author.posts.all()
+
+
+class AtomIndexFeed(IndexFeed):
+    feed_type = Atom1Feed
+    subtitle = IndexFeed.description
+
+
+class AtomGroupFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class AtomAuthorFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+def _feed_name(slug=None, username=None):
+    if slug is not None:
+        group_id = Group.objects.filter(slug=slug).values_list(
+            'pk', flat=True).first()
+        return group_id and feed_cache.group_feed(group_id)
+    if username is not None:
+        author_id = User.objects.filter(username=username).values_list(
+            'pk', flat=True).first()
+        return author_id and feed_cache.author_feed(author_id)
+    return feed_cache.INDEX
+
+
+def _etag(request, **kwargs):
+    return feed_cache.per_request(
+        request, 'syndication_etag', lambda: _compute_etag(request, **kwargs))
+
+
+def _compute_etag(request, **kwargs):
+    feed = _feed_name(**kwargs)
+    if not feed:
+        return None
+    return '-'.join((
+        str(feed_cache.version(feed, request)),
+        hashlib.md5(request.get_full_path().encode()).hexdigest()[:12],
+    ))
+
+
+def cached(feed):
+    """Представление ленты с кэшем ответа и условным GET.
+
+    В ленте абсолютные ссылки, поэтому ответ кэшируется отдельно
+    для каждого хоста.
+    """
+    @condition(etag_func=_etag)
+    def view(request, **kwargs):
+        etag = _etag(request, **kwargs)
+        if etag is None:
+            return feed(request, **kwargs)
+        host = hashlib.md5(request.get_host().encode()).hexdigest()[:12]
+        key = f'syndication:{host}:{etag}'
+        response = cache.get(key)
+        if response is None:
+            response = feed(request, **kwargs)
+            cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+        return response
+    return view
+
+
+index_rss = cached(IndexFeed())
+index_atom = cached(AtomIndexFeed())
+group_rss = cached(GroupFeed())
+group_atom = cached(AtomGroupFeed())
+author_rss = cached(AuthorFeed())
+author_atom = cached(AtomAuthorFeed())
@@ -0,0 +1,133 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс ``posts_post_fts`` — внешняя FTS5-таблица поверх ``posts_post``,
+которую поддерживают триггеры, поэтому в неё попадают и записи из
+``bulk_create``/``update``. Таблица и триггеры ставятся после миграций,
+а не миграцией: SQLite-бэкенд Django пересоздаёт ``posts_post`` при
+части изменений схемы и теряет триггеры, а ``install`` их восстанавливает.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    f'{FTS_TABLE}_ad': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    f'{FTS_TABLE}_au': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+}
+# Маркеры подсветки не встречаются в тексте постов и переживают escape.
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """Создаёт FTS-таблицу и триггеры, если их нет, и заполняет индекс."""
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        # Миграции приложений по отдельности: постов может ещё не быть.
+        if Post._meta.db_table not in using.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'")
+        if set(TRIGGERS) <= {row[0] for row in cursor.fetchall()}:
+            return
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "text, content='posts_post', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')")
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Запрос пользователя как безопасное FTS5-выражение с префиксами."""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset только посты, подходящие под запрос."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not available():
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (expression,)))
+
+
+class SearchResults:
+    """Ленивая выборка для Paginator: ранжированные посты со сниппетами."""
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+
+    def count(self):
+        if not self.expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', (self.expression,))
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, key):
+        if not self.expression:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, 24) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                (MARK_START, MARK_END, '…', self.expression,
+                 key.stop - key.start, key.start))
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                results.append(posts[pk])
+        return results
+
+
+def search(query):
+    if not available():
+        return Post.objects.select_related('author', 'group').filter(
+            text__icontains=query)
+    return SearchResults(query)
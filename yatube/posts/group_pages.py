@@ -0,0 +1,141 @@
+"""Готовые первые страницы лент групп в кэше.
+
+Для каждой группы в кэше лежат ``(pub_date, id)`` её последних
+``GROUP_FEED_PAGES * COUNT_POST`` постов и общее число постов из
+счётчика ``Group.posts_count``, а
+представление поднимает посты страницы одним запросом ``in_bulk``.
+Страницы за пределами окна и курсорная навигация читают базу как обычно.
+Сигналы сохранения, удаления и переноса поста сбрасывают список группы
+сразу и ещё раз после коммита, а собирается он заново при первом чтении:
+правка на месте из разных процессов теряла бы изменения, а откат
+транзакции оставлял бы в списке несуществующие посты.
+
+Здесь же кэшируются группа по slug и множество групп, на которые
+подписан пользователь: кнопка подписки накладывается на общую для
+всех страницу отдельно. Всё, что ложится в кэш, читается из основной
+базы: с отстающей реплики в кэш попало бы состояние до записи.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from core.db_routers import use_primary
+
+from . import feed_cache
+from .models import FollowGroup, Group, Post
+
+
+def _key(group_id):
+    return f'group_pages:{group_id}'
+
+
+def _slug_key(slug):
+    # В slug бывает кириллица, а memcached принимает только ASCII.
+    return f'group_slug:{hashlib.md5(slug.encode()).hexdigest()}'
+
+
+def _limit():
+    return settings.GROUP_FEED_PAGES * settings.COUNT_POST
+
+
+def get_group(slug):
+    """Группа по slug из кэша или None, если такой нет."""
+    group = cache.get(_slug_key(slug))
+    if group is None:
+        with use_primary():
+            group = Group.objects.filter(slug=slug).first()
+        if group is not None:
+            cache.set(_slug_key(slug), group, settings.FEED_CACHE_TIMEOUT)
+    return group
+
+
+def forget_group(group, *slugs):
+    cache.delete_many([_slug_key(slug) for slug in (group.slug, *slugs)])
+    cache.delete(_key(group.pk))
+
+
+def followed(user):
+    """Id групп, на которые подписан пользователь."""
+    if not user.is_authenticated:
+        return frozenset()
+    # Версия подписок меняется при каждой подписке и отписке.
+    key = (f'followed_groups:{user.pk}:'
+           f'{feed_cache.version(feed_cache.follows_feed(user.pk))}')
+    groups = cache.get(key)
+    if groups is None:
+        with use_primary():
+            groups = frozenset(FollowGroup.objects.filter(
+                user=user).values_list('group', flat=True))
+        cache.set(key, groups, settings.FEED_CACHE_TIMEOUT)
+    return groups
+
+
+def _entry(group_id):
+    entry = cache.get(_key(group_id))
+    if entry is None:
+        with use_primary():
+            posts = [
+                (-pub_date.timestamp(), -pk) for pk, pub_date in
+                Post.objects.filter(group=group_id).order_by(
+                    '-pub_date', '-pk').values_list(
+                    'pk', 'pub_date')[:_limit()]
+            ]
+            count = len(posts)
+            if count == _limit():
+                # Вместо COUNT(*) по постам — счётчик группы. Группа из
+                # кэша по slug не видит новых постов, поэтому он читается
+                # заново, и только если в список попали не все посты.
+                count = max(count, Group.objects.filter(
+                    pk=group_id).values_list(
+                    'posts_count', flat=True).first() or 0)
+        entry = {'posts': posts, 'count': count}
+        cache.set(_key(group_id), entry, settings.FEED_CACHE_TIMEOUT)
+    return entry
+
+
+def forget(group_ids):
+    """Сбрасывает списки групп, например после массовой загрузки."""
+    cache.delete_many([_key(group_id) for group_id in group_ids])
+
+
+def forget_on_commit(group_ids):
+    """Сбрасывает списки сейчас и после коммита.
+
+    Без второго сброса параллельный запрос может успеть собрать список
+    по базе, в которой изменений ещё не видно.
+    """
+    group_ids = [group_id for group_id in group_ids if group_id]
+    forget(group_ids)
+    transaction.on_commit(lambda: forget(group_ids))
+
+
+class GroupPaginator(Paginator):
+    """Нумерованные страницы ленты группы из готового списка id.
+
+    Страницы, которых нет в списке, читаются из ``posts`` через OFFSET.
+    """
+
+    def __init__(self, group, posts):
+        super().__init__(posts, settings.COUNT_POST)
+        entry = _entry(group.pk)
+        self.ids = [-pk for _, pk in entry['posts']]
+        self.cached_count = entry['count']
+
+    @cached_property
+    def count(self):
+        return self.cached_count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = min(bottom + self.per_page, self.count)
+        if top > len(self.ids) and len(self.ids) < self.count:
+            return super().page(number)
+        ids = self.ids[bottom:top]
+        posts = self.object_list.in_bulk(ids)
+        return self._get_page(
+            [posts[pk] for pk in ids if pk in posts], number, self)
@@ -0,0 +1,95 @@
+"""Сборка постов ленты без JOIN с авторами и группами.
+
+Ленты читают только строки постов, а авторов и группы страницы
+подставляют из карты идентичности процесса: одни и те же популярные
+авторы и группы не тянутся заново в каждой строке каждого запроса.
+Недостающие объекты догружаются одним ``in_bulk`` на модель. Записи
+карты живут ``HYDRATION_TTL`` секунд, а при изменении и удалении сигналы
+меняют версию карты в общем кэше: увидев новую версию, карты остальных
+процессов очищаются и не подставляют устаревших авторов во фрагменты
+общего кэша. Объекты из карты общие для запросов — только для чтения.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Group, Post, User
+
+
+class IdentityMap:
+    """Объекты модели по id с ограниченным временем жизни."""
+
+    def __init__(self, model):
+        self.model = model
+        self._objects = OrderedDict()
+        self._version = None
+        self._lock = Lock()
+
+    @property
+    def _version_key(self):
+        return f'identity_map:{self.model._meta.label_lower}'
+
+    def get_many(self, ids):
+        now = time.monotonic()
+        found = {}
+        version = cache.get_or_set(self._version_key, time.time_ns(), None)
+        with self._lock:
+            if version != self._version:
+                self._objects.clear()
+                self._version = version
+            for pk in ids:
+                entry = self._objects.get(pk)
+                if entry is not None and entry[0] > now:
+                    found[pk] = entry[1]
+        missing = set(ids) - set(found)
+        if missing:
+            loaded = self.model.objects.in_bulk(missing)
+            expires = now + settings.HYDRATION_TTL
+            with self._lock:
+                for pk, obj in loaded.items():
+                    self._objects.pop(pk, None)
+                    self._objects[pk] = (expires, obj)
+                # Вытесняются самые давно загруженные записи.
+                while len(self._objects) > settings.HYDRATION_MAX_OBJECTS:
+                    self._objects.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def evict(self, pk):
+        """Убирает объект из карты и сбрасывает карты других процессов."""
+        with self._lock:
+            self._objects.pop(pk, None)
+        cache.set(self._version_key, time.time_ns(), None)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+authors = IdentityMap(User)
+groups = IdentityMap(Group)
+
+
+def hydrate(posts):
+    """Подставляет постам авторов и группы; возвращает список постов.
+
+    Уже загруженные связи (например, группа у ``group.posts``) не трогает.
+    """
+    posts = list(posts)
+    relations = (
+        (Post.author.field, authors, 'author_id'),
+        (Post.group.field, groups, 'group_id'),
+    )
+    for field, identity_map, attname in relations:
+        pending = [post for post in posts if getattr(post, attname)
+                   and not field.is_cached(post)]
+        objects = identity_map.get_many(
+            {getattr(post, attname) for post in pending})
+        for post in pending:
+            obj = objects.get(getattr(post, attname))
+            if obj is not None:
+                field.set_cached_value(post, obj)
+    return posts
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.db_routers import PRIMARY
+from core.sqlite import copy_database
+from posts import comment_queue
+from posts.models import Post, User
+
+TEXT = 'benchmark'
+
+
+def worker(path, options, seconds, seed, post_ids, user_ids, results):
+    # Процесс получен через fork: своё соединение к копии базы.
+    connections.close_all()
+    connections[PRIMARY].settings_dict['NAME'] = path
+    rng = random.Random(seed)
+    sent = errors = 0
+    with override_settings(**options):
+        client = Client()
+        client.force_login(User.objects.get(pk=rng.choice(user_ids)))
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            url = reverse('posts:add_comment', args=(rng.choice(post_ids),))
+            try:
+                client.post(url, {'text': TEXT})
+                sent += 1
+            except OperationalError:
+                errors += 1
+        if settings.COMMENT_WRITE_BEHIND:
+            comment_queue.flush(wait=True)
+    connections.close_all()
+    results.put((sent, errors))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает, сколько комментариев в секунду принимает '
+            'add_comment с записью в базу на каждый запрос и с отложенной '
+            'записью пачками. Несколько процессов пишут в копию базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, workers, seconds, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на SQLite.')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:10000])
+        user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+        if not post_ids or not user_ids:
+            raise CommandError(
+                'Нет данных: сначала запустите generate_dataset.')
+        results = {}
+        for name, write_behind in (('sync', False), ('batched', True)):
+            with tempfile.TemporaryDirectory(
+                    dir=os.path.dirname(primary.settings_dict['NAME'])
+            ) as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                copy_database(
+                    primary, path, settings.SQLITE_PRAGMAS['journal_mode'])
+                before = self.saved(path)
+                started = time.perf_counter()
+                sent, errors = self.run(path, {
+                    'COMMENT_WRITE_BEHIND': write_behind,
+                    'COMMENT_QUEUE_DIR': os.path.join(directory, 'queue'),
+                }, workers, seconds, post_ids, user_ids)
+                # Время вместе с финальным сбросом очереди.
+                elapsed = time.perf_counter() - started
+                saved = self.saved(path) - before
+            results[name] = saved / elapsed
+            self.stdout.write(
+                f'{name:>7}: принято {sent / seconds:7.0f}/с, '
+                f'сохранено {results[name]:7.0f}/с '
+                f'({saved} из {sent}), ошибок {errors}')
+        if results['sync']:
+            self.stdout.write(
+                f'Ускорение: {results["batched"] / results["sync"]:.2f}x')
+
+    def saved(self, path):
+        database = sqlite3.connect(path)
+        try:
+            return database.execute(
+                'SELECT COUNT(*) FROM posts_comment WHERE text = ?',
+                (TEXT,)).fetchone()[0]
+        finally:
+            database.close()
+
+    def run(self, path, options, workers, seconds, post_ids, user_ids):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=worker, args=(
+                path, options, seconds, seed, post_ids, user_ids, queue))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [0, 0]
+        for _ in processes:
+            for index, value in enumerate(queue.get()):
+                totals[index] += value
+        for process in processes:
+            process.join()
+        return tuple(totals)
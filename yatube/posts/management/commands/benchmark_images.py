@@ -0,0 +1,79 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from sorl.thumbnail.engines.pil_engine import Engine as PilEngine
+
+from posts import thumbnails
+from posts.models import Post
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает размер картинок ленты: оригиналы, прежняя '
+            'миниатюра (один JPEG sorl по умолчанию) и новые варианты '
+            'по ширинам и форматам. Итог — байты на страницу ленты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы или каталоги с картинками; по умолчанию — '
+                 'картинки последних постов.')
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--size', default='card')
+
+    def handle(self, *args, paths, limit, size, **options):
+        samples = list(self.samples(paths, limit))
+        if not samples:
+            raise CommandError('Нет картинок для замера.')
+        geometry, base_options = settings.POST_THUMBNAILS[size]
+        totals = {'original': 0, 'before': 0}
+        variants = thumbnails.variants(size)
+        for name, data in samples:
+            totals['original'] += len(data)
+            # Прежний конвейер: один размер, качество и метаданные sorl.
+            totals['before'] += len(thumbnails.encode(
+                name, data, geometry, base_options, engine=PilEngine()))
+            for variant in variants:
+                key = (variant.format, variant.width)
+                totals[key] = totals.get(key, 0) + len(thumbnails.encode(
+                    name, data, variant.geometry, variant.options))
+        page = settings.COUNT_POST / len(samples)
+        self.stdout.write(
+            f'Картинок: {len(samples)}, на странице ленты: '
+            f'{settings.COUNT_POST}, '
+            f'форматы: {", ".join(thumbnails.formats())}')
+        self.report('оригиналы', totals['original'] * page)
+        self.report(f'было: {geometry} JPEG', totals['before'] * page)
+        for variant in variants:
+            kilobytes = totals[variant.format, variant.width] * page
+            self.report(
+                f'{variant.format} {variant.width}w', kilobytes,
+                kilobytes / (totals['before'] * page) - 1)
+
+    def report(self, label, size, change=None):
+        line = f'{label:<24} {size / 1024:9.1f} КБ на страницу'
+        if change is not None:
+            line += f'  {change:+.0%}'
+        self.stdout.write(line)
+
+    def samples(self, paths, limit):
+        if not paths:
+            names = Post.objects.exclude(image='').order_by(
+                '-pub_date').values_list('image', flat=True)
+            for name in names[:limit]:
+                if default_storage.exists(name):
+                    with default_storage.open(name) as image:
+                        yield name, image.read()
+            return
+        for path in paths:
+            files = [path]
+            if os.path.isdir(path):
+                files = sorted(
+                    os.path.join(path, name) for name in os.listdir(path)
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+            for file_path in files[:limit]:
+                with open(file_path, 'rb') as image:
+                    yield file_path, image.read()
@@ -0,0 +1,71 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from faker import Faker
+
+from posts.fulltext import match_expression
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск FTS5 с icontains (LIKE) на синтетической '
+            'таблице постов в отдельной временной базе SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500_000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, posts, queries, seed, **options):
+        random.seed(seed)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        words = list({fake.word() for _ in range(5000)})
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            self.fill(db, words, posts)
+            sample = random.sample(words, queries)
+            # Как и страница результатов: COUNT(*) для пагинатора
+            # плюс первая страница.
+            like = self.measure(db, sample, (
+                'SELECT count(*) FROM posts_post WHERE text LIKE ? '
+                "ESCAPE '\\'",
+                'SELECT id FROM posts_post WHERE text LIKE ? ESCAPE '
+                "'\\' ORDER BY id DESC LIMIT ?"), lambda word: f'%{word}%')
+            fts = self.measure(db, sample, (
+                'SELECT count(*) FROM posts_post_fts WHERE posts_post_fts '
+                'MATCH ?',
+                'SELECT rowid FROM posts_post_fts WHERE posts_post_fts '
+                'MATCH ? ORDER BY rank LIMIT ?'), match_expression)
+            db.close()
+        self.stdout.write(f'Постов: {posts}, запросов: {queries}')
+        self.stdout.write(f'icontains: {like:.2f} мс на запрос')
+        self.stdout.write(f'FTS5:      {fts:.2f} мс на запрос')
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: x{like / fts:.1f}'))
+
+    def fill(self, db, words, posts):
+        db.executescript(
+            'CREATE TABLE posts_post (id INTEGER PRIMARY KEY, text TEXT);'
+            'CREATE VIRTUAL TABLE posts_post_fts USING fts5(text, '
+            "content='posts_post', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2');")
+        rows = (
+            (' '.join(random.choices(words, k=random.randint(10, 60))),)
+            for _ in range(posts))
+        db.executemany('INSERT INTO posts_post (text) VALUES (?)', rows)
+        db.execute(
+            "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')")
+        db.commit()
+
+    def measure(self, db, sample, queries, to_param):
+        count_sql, page_sql = queries
+        started = time.perf_counter()
+        for word in sample:
+            param = to_param(word)
+            db.execute(count_sql, (param,)).fetchone()
+            db.execute(page_sql, (param, settings.COUNT_POST)).fetchall()
+        return (time.perf_counter() - started) * 1000 / len(sample)
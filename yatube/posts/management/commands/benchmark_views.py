@@ -0,0 +1,139 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет p50/p95 времени ответа и число SQL-запросов '
+            'представлений лент и сохраняет результат в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        cases = self.cases()
+        results = {}
+        for name, (client, urls) in cases.items():
+            results[name] = self.measure(
+                client, urls, options['requests'], options['cold'])
+            self.report(name, results[name])
+        payload = {
+            'commit': self.commit(),
+            'created': timezone.now().isoformat(),
+            'posts': Post.objects.count(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'views': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(payload, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def cases(self):
+        post = Post.objects.order_by('?').first()
+        group = Group.objects.annotate(total=Count('posts')).order_by(
+            '-total').first()
+        author = User.objects.annotate(total=Count('posts')).order_by(
+            '-total').first()
+        reader = User.objects.annotate(total=Count('timeline')).order_by(
+            '-total').first()
+        if None in (post, group, author, reader):
+            raise CommandError(
+                'База пуста: сначала запустите generate_dataset.')
+        anonymous = Client()
+        logged_in = Client()
+        logged_in.force_login(reader)
+        return {
+            'index': (anonymous, self.pages(reverse('posts:posts_index'))),
+            'group_posts': (anonymous, self.pages(
+                reverse('posts:group_list', args=(group.slug,)))),
+            'profile': (anonymous, self.pages(
+                reverse('posts:profile', args=(author.username,)))),
+            'post_detail': (anonymous, [
+                reverse('posts:post_detail', args=(pk,))
+                for pk in Post.objects.order_by('?').values_list(
+                    'pk', flat=True)[:20]]),
+            'follow_index': (logged_in, self.pages(
+                reverse('posts:follow_index'))),
+        }
+
+    def pages(self, url):
+        return [url] + [f'{url}?page={page}' for page in (2, 5, 50)]
+
+    def measure(self, client, urls, requests, cold):
+        latencies = []
+        queries = []
+        for _ in range(requests):
+            if cold:
+                cache.clear()
+            url = random.choice(urls)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url} ответил {response.status_code}')
+            queries.append(len(captured))
+        return {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'queries_p50': statistics.median(queries),
+            'queries_max': max(queries),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<14} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'SQL {result["queries_p50"]:g} (макс. {result["queries_max"]})')
+
+    def compare(self, path, results):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f'Сравнение с {previous.get("commit") or path}:')
+        for name, result in results.items():
+            old = previous['views'].get(name)
+            if old is None:
+                continue
+            self.stdout.write(
+                f'{name:<14} p50 {result["p50_ms"] - old["p50_ms"]:+8.2f} мс'
+                f'  p95 {result["p95_ms"] - old["p95_ms"]:+8.2f} мс  '
+                f'SQL {result["queries_max"] - old["queries_max"]:+d}')
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'), capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
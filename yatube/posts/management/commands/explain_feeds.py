@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts import feed_queries
+from posts.models import Group, Post, User
+from posts.utils import NEXT, CursorPaginator
+
+
+def feed_querysets(user, group):
+    """Основные запросы лент, собранные теми же функциями, что и в
+    представлениях, вместе со следующими страницами курсорной навигации.
+
+    Авторов и группы страницы подставляет hydration, поэтому
+    select_related в запросах нет.
+    """
+    querysets = {
+        'index': feed_queries.index(),
+        'group_posts': feed_queries.group(group),
+        'profile': feed_queries.profile(user),
+        'follow_index': feed_queries.follow(user),
+        'trending': feed_queries.trending(),
+    }
+    cursors = {
+        'cursor': CursorPaginator(
+            querysets['index'], settings.COUNT_POST),
+        'follow_cursor': CursorPaginator(
+            querysets['follow_index'], settings.COUNT_POST,
+            **feed_queries.FOLLOW_ORDER),
+    }
+    for name, pages in cursors.items():
+        querysets[name] = pages.page_posts(NEXT, timezone.now(), 0)
+    return querysets
+
+
+def explain(queryset):
+    sql, params = queryset[:settings.COUNT_POST].query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = ('Печатает EXPLAIN QUERY PLAN основных запросов лент '
+            'и отмечает запросы, которым нужна сортировка.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда рассчитана на SQLite.')
+        user = User.objects.first()
+        group = Group.objects.first()
+        if user is None or group is None:
+            raise CommandError('Нужны хотя бы один пользователь и группа.')
+        self.stdout.write(f'Постов в базе: {Post.objects.count()}')
+        for name, queryset in feed_querysets(user, group).items():
+            plan = explain(queryset)
+            sorted_ = any('TEMP B-TREE' in step for step in plan)
+            style = self.style.ERROR if sorted_ else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{name}: {"сортировка" if sorted_ else "индекс"}'))
+            for step in plan:
+                self.stdout.write(f'    {step}')
@@ -0,0 +1,73 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты в NDJSON или CSV потоком, пачками '
+            'по первичному ключу, не загружая всю таблицу в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout.')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default=None,
+            help='Формат; по умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, path, batch_size, **options):
+        output_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        started = time.perf_counter()
+        if path == '-':
+            count = self.export(sys.stdout, output_format, batch_size)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                count = self.export(output, output_format, batch_size)
+        elapsed = time.perf_counter() - started
+        # В stdout могут идти сами данные, поэтому отчёт — в stderr.
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {count} за {elapsed:.1f} с '
+            f'({count / elapsed if elapsed else 0:.0f} строк/с)'))
+
+    def rows(self, batch_size):
+        posts = Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+            'image')
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1][0]
+            for pk, author, group, text, pub_date, image in batch:
+                yield {
+                    'id': pk,
+                    'author': author,
+                    'group': group,
+                    'text': text,
+                    'pub_date': pub_date.isoformat(),
+                    'image': image,
+                }
+
+    def export(self, output, output_format, batch_size):
+        count = 0
+        if output_format == 'csv':
+            writer = csv.DictWriter(output, FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(row):
+                output.write(json.dumps(row, ensure_ascii=False) + '\n')
+        for row in self.rows(batch_size):
+            write(row)
+            count += 1
+        return count
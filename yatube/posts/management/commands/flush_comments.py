@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = ('Сохраняет в базу комментарии из очереди отложенной записи, '
+            'в том числе оставшиеся после перезапуска.')
+
+    def handle(self, *args, **options):
+        saved = comment_queue.flush(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено комментариев: {saved}'))
@@ -0,0 +1,178 @@
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from posts.models import Comment, Follow, FollowGroup, Group, Post, User
+from posts.utils import manual_dates
+
+IMAGE_DIR = 'posts/dataset'
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами с картинками, комментариями и подписками со '
+            'степенным распределением популярности авторов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.2,
+            help='Показатель степенного закона популярности авторов.')
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой.')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        random.seed(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.mixer = Mixer(commit=False)
+        started = time.perf_counter()
+        prefix = f'u{int(time.time())}'
+        users = self.create_users(prefix)
+        groups = self.create_groups(prefix)
+        images = self.create_images()
+        weights = [1 / (rank + 1) ** options['alpha']
+                   for rank in range(len(users))]
+        posts = self.create_posts(users, groups, images, weights)
+        self.create_comments(users, posts)
+        self.create_follows(users, groups, weights)
+        self.stdout.write('Пересчёт лент и счётчиков...')
+        call_command('rebuild_timelines', stdout=self.stdout)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('update_trending', stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def bulk(self, model, objects, ignore_conflicts=False):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                self.flush(model, batch, ignore_conflicts)
+                batch = []
+        if batch:
+            self.flush(model, batch, ignore_conflicts)
+
+    def flush(self, model, batch, ignore_conflicts):
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts)
+
+    def random_date(self):
+        return timezone.now() - timedelta(
+            seconds=random.randint(0, self.options['days'] * 86400))
+
+    def create_users(self, prefix):
+        self.bulk(User, (
+            self.mixer.blend(
+                User, username=f'{prefix}_{index}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                email=f'{prefix}_{index}@example.com', password='!',
+                is_active=True, is_staff=False, is_superuser=False)
+            for index in range(self.options['users'])))
+        users = list(User.objects.filter(
+            username__startswith=f'{prefix}_').values_list('pk', flat=True))
+        random.shuffle(users)
+        self.stdout.write(f'Пользователей: {len(users)}')
+        return users
+
+    def create_groups(self, prefix):
+        self.bulk(Group, (
+            Group(title=self.fake.catch_phrase()[:200],
+                  slug=f'{prefix}-{index}',
+                  description=self.fake.paragraph())
+            for index in range(self.options['groups'])))
+        groups = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('pk', flat=True))
+        self.stdout.write(f'Групп: {len(groups)}')
+        return groups
+
+    def create_images(self):
+        directory = os.path.join(settings.MEDIA_ROOT, IMAGE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        images = []
+        for index in range(10):
+            name = f'{IMAGE_DIR}/sample_{index}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if not os.path.exists(path):
+                color = tuple(random.randint(0, 255) for _ in range(3))
+                Image.new('RGB', (1280, 720), color).save(path, 'JPEG')
+            images.append(name)
+        return images
+
+    def create_posts(self, users, groups, images, weights):
+        count = self.options['posts']
+        authors = random.choices(users, weights=weights, k=count)
+        with manual_dates(Post._meta.get_field('pub_date')):
+            self.bulk(Post, (
+                Post(author_id=author,
+                     text=self.fake.text(max_nb_chars=400),
+                     group_id=(random.choice(groups)
+                               if groups and random.random() < 0.5
+                               else None),
+                     image=(random.choice(images)
+                            if random.random() < self.options['images']
+                            else ''),
+                     pub_date=self.random_date())
+                for author in authors))
+        posts = list(Post.objects.filter(
+            author__in=users).values_list('pk', flat=True))
+        self.stdout.write(f'Постов: {len(posts)}')
+        return posts
+
+    def create_comments(self, users, posts):
+        if not posts:
+            return
+        with manual_dates(Comment._meta.get_field('created')):
+            self.bulk(Comment, (
+                Comment(post_id=random.choice(posts),
+                        author_id=random.choice(users),
+                        text=self.fake.sentence(),
+                        created=self.random_date())
+                for _ in range(self.options['comments'])))
+        self.stdout.write(f'Комментариев: {self.options["comments"]}')
+
+    def create_follows(self, users, groups, weights):
+        follows = []
+        group_follows = []
+        for user in users:
+            # Число подписок тоже распределено с тяжёлым хвостом.
+            count = min(len(users) - 1, int(
+                random.paretovariate(2) * self.options['follows'] / 2))
+            for author in set(random.choices(users, weights=weights,
+                                             k=count)) - {user}:
+                follows.append(Follow(user_id=user, author_id=author))
+            if groups:
+                for group in set(random.choices(
+                        groups, k=random.randint(0, 3))):
+                    group_follows.append(
+                        FollowGroup(user_id=user, group_id=group))
+        self.bulk(Follow, follows, ignore_conflicts=True)
+        self.bulk(FollowGroup, group_follows, ignore_conflicts=True)
+        self.stdout.write(
+            f'Подписок: {len(follows)}, на группы: {len(group_follows)}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры всех размеров для картинок существующих постов.'
+
+    def handle(self, *args, **options):
+        count = 0
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True).order_by()
+        for name in images.iterator():
+            thumbnails.render(name)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {count}'))
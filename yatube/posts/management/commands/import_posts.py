@@ -0,0 +1,118 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, feed_cache, group_pages, timeline, trending
+from posts.models import Group, Post, User
+from posts.utils import manual_dates
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из NDJSON или CSV (формат export_posts) '
+            'потоком через bulk_create, по транзакции на пачку.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для загрузки, «-» — читать из stdin.')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default=None,
+            help='Формат; по умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path, batch_size, **options):
+        input_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        # Авторы и группы ищутся в памяти, а не запросом на каждую строку.
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.skipped = 0
+        self.author_ids = set()
+        self.group_ids = set()
+        started = time.perf_counter()
+        if path == '-':
+            count = self.load(sys.stdin, input_format, batch_size, started)
+        else:
+            try:
+                source = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(error)
+            with source:
+                count = self.load(source, input_format, batch_size, started)
+        elapsed = time.perf_counter() - started
+        self.stdout.write('Пересборка лент подписчиков...')
+        rebuilt = timeline.rebuild_followers(self.author_ids, self.group_ids)
+        feed_cache.bump(
+            [feed_cache.INDEX]
+            + [feed_cache.author_feed(pk) for pk in self.author_ids]
+            + [feed_cache.group_feed(pk) for pk in self.group_ids])
+        group_pages.forget(self.group_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {count}, пропущено: {self.skipped} '
+            f'за {elapsed:.1f} с ({count / elapsed if elapsed else 0:.0f} '
+            f'строк/с); пересобрано лент: {rebuilt}'))
+
+    def records(self, source, input_format):
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.skip(f'Строка {number}: не JSON')
+
+    def skip(self, reason):
+        self.skipped += 1
+        self.stderr.write(f'{reason}, пропущено')
+
+    def build(self, number, record):
+        author_id = self.authors.get(record.get('author'))
+        if author_id is None:
+            self.skip(f'Запись {number}: нет автора {record.get("author")!r}')
+            return None
+        group_id = None
+        if record.get('group'):
+            group_id = self.groups.get(record['group'])
+            if group_id is None:
+                self.skip(f'Запись {number}: нет группы {record["group"]!r}')
+                return None
+        pub_date = parse_datetime(record.get('pub_date') or '')
+        if pub_date is None:
+            pub_date = timezone.now()
+        elif timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        return Post(author_id=author_id, group_id=group_id,
+                    text=record.get('text') or '',
+                    image=record.get('image') or '', pub_date=pub_date,
+                    trending_score=trending.score(0, pub_date))
+
+    def load(self, source, input_format, batch_size, started):
+        count = 0
+        records = enumerate(self.records(source, input_format), 1)
+        with manual_dates(Post._meta.get_field('pub_date')):
+            while True:
+                chunk = list(islice(records, batch_size))
+                if not chunk:
+                    return count
+                posts = [post for post in (
+                    self.build(number, record) for number, record in chunk)
+                    if post is not None]
+                with transaction.atomic():
+                    Post.objects.bulk_create(posts)
+                    counters.posts_imported(posts)
+                self.author_ids.update(post.author_id for post in posts)
+                self.group_ids.update(
+                    post.group_id for post in posts if post.group_id)
+                count += len(posts)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{count} строк, {count / elapsed:.0f} строк/с')
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import AuthorStats, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики постов и комментариев '
+            'с фактическими данными и исправляет расхождения пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк сверять в одной транзакции.')
+
+    def handle(self, *args, batch_size, **options):
+        self.batch_size = batch_size
+        fixed = (
+            self.reconcile(
+                Post, 'comments_count', Post.objects.annotate(
+                    total=Count('comments')))
+            + self.reconcile(
+                Group, 'posts_count', Group.objects.annotate(
+                    total=Count('posts')))
+            + self.reconcile_authors()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {fixed}'))
+
+    def batches(self, queryset):
+        last_pk = None
+        queryset = queryset.order_by('pk')
+        while True:
+            page = queryset if last_pk is None else queryset.filter(
+                pk__gt=last_pk)
+            batch = list(page[:self.batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield batch
+
+    def reconcile(self, model, field, queryset):
+        fixed = 0
+        for batch in self.batches(queryset):
+            stale = [obj for obj in batch if getattr(obj, field) != obj.total]
+            for obj in stale:
+                setattr(obj, field, obj.total)
+            with transaction.atomic():
+                model.objects.bulk_update(stale, (field,))
+            fixed += len(stale)
+        return fixed
+
+    def reconcile_authors(self):
+        fixed = 0
+        queryset = User.objects.annotate(total=Count('posts'))
+        for batch in self.batches(queryset):
+            stats = AuthorStats.objects.in_bulk(
+                [user.pk for user in batch])
+            stale = [
+                AuthorStats(user_id=user.pk, posts_count=user.total)
+                for user in batch
+                if user.pk not in stats
+                or stats[user.pk].posts_count != user.total
+            ]
+            with transaction.atomic():
+                AuthorStats.objects.filter(
+                    user__in=[stat.user_id for stat in stale]).delete()
+                AuthorStats.objects.bulk_create(stale)
+            fixed += len(stale)
+        return fixed
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import trending
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает оценки ленты «Популярное» пачками: после '
+            'массовой загрузки, сверки счётчиков или смены формулы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов пересчитывать в одной транзакции.')
+
+    def handle(self, *args, batch_size, **options):
+        updated = 0
+        last_pk = 0
+        posts = Post.objects.order_by('pk').values_list('pk', flat=True)
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]
+            with transaction.atomic():
+                updated += trending.refresh(
+                    Post.objects.filter(pk__in=batch))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено оценок: {updated}'))
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:05
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# Формула posts.trending.score на момент миграции: миграция не должна
+# меняться вместе с кодом приложения.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+DECAY_SECONDS = 60 * 60 * 12
+BATCH_SIZE = 500
+
+
+def fill_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.only('comments_count', 'pub_date').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        for post in batch:
+            post.trending_score = (
+                math.log10(max(post.comments_count, 1))
+                + (post.pub_date - EPOCH).total_seconds() / DECAY_SECONDS)
+        Post.objects.bulk_update(batch, ('trending_score',))
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Оценка популярности'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['trending_score'], name='post_trending_score_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:40
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+
+
+def fill_timelines(apps, schema_editor):
+    # Логика posts.timeline.rebuild на момент миграции: до неё таблица
+    # лент пуста, и follow_index не показал бы ни одного поста.
+    Follow = apps.get_model('posts', 'Follow')
+    FollowGroup = apps.get_model('posts', 'FollowGroup')
+    Post = apps.get_model('posts', 'Post')
+    Timeline = apps.get_model('posts', 'Timeline')
+    users = Follow.objects.values_list('user', flat=True).union(
+        FollowGroup.objects.values_list('user', flat=True))
+    for user_id in list(users):
+        posts = Post.objects.filter(
+            Q(author__in=Follow.objects.filter(
+                user=user_id).values('author'))
+            | Q(group__in=FollowGroup.objects.filter(
+                user=user_id).values('group')),
+        ).order_by('-pub_date').values_list('pk', 'pub_date')
+        Timeline.objects.bulk_create(
+            (Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts[:settings.TIMELINE_LIMIT]),
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_trending_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,8 @@ class Group(models.Model):
     title = models.CharField("Название", max_length=200)
     slug = models.SlugField("Название группы", unique=True)
     description = models.TextField("Описание")
+    posts_count = models.PositiveIntegerField(
+        'Количество постов', default=0, editable=False)
 
     class Meta:
         verbose_name_plural = 'Группы'
@@ -41,15 +43,46 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False)
+    trending_score = models.FloatField(
+        'Оценка популярности', default=0, editable=False)
 
     class Meta:
         ordering = ('-pub_date'),
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(fields=('pub_date',),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', 'pub_date'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', 'pub_date'),
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=('trending_score',),
+                         name='post_trending_score_idx'),
+        )
 
     def __str__(self):
         return self.text[:30]
 
 
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Автор',
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Количество постов', default=0)
+
+    class Meta:
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}'
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -74,6 +107,12 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = (
+            models.Index(fields=('post', 'created'),
+                         name='comment_post_created_idx'),
+        )
+
     def __str__(self):
         return self.text[:30]
 
@@ -92,6 +131,12 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        )
+
 
 class FollowGroup(models.Model):
     user = models.ForeignKey(
@@ -106,3 +151,39 @@ class FollowGroup(models.Model):
         verbose_name='Подписчик',
         related_name='followin'
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'group'),
+                                    name='unique_follow_group'),
+        )
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Читатель',
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name='Пост',
+        related_name='timelines',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name_plural = 'Ленты подписок'
+        indexes = (
+            # По возрастанию: обратный проход даёт (pub_date, id) от новых
+            # к старым, и id строки разделяет записи с одной датой.
+            models.Index(fields=('user', 'pub_date'),
+                         name='timeline_user_pub_date_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_post'),
+        )
@@ -0,0 +1,132 @@
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import feed_cache, group_pages, hydration, timeline, trending
+from .models import Comment, Follow, FollowGroup, Group, Post, User
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Через __dict__, чтобы не подгружать отложенное поле отдельным запросом.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(pre_save, sender=Post)
+def post_scored(sender, instance, **kwargs):
+    if instance._state.adding:
+        # auto_now_add всё равно запишет в pub_date текущее время.
+        instance.trending_score = trending.score(
+            instance.comments_count, timezone.now())
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = None if created else instance._loaded_group_id
+    # Правка текста не меняет, чьим лентам принадлежит пост.
+    if created or old_group_id != instance.group_id:
+        timeline.push_post(instance)
+    feed_cache.bump(feed_cache.post_feeds(
+        instance, instance._loaded_group_id))
+    if old_group_id != instance.group_id:
+        group_pages.forget_on_commit((old_group_id, instance.group_id))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.post_feeds(instance))
+    group_pages.forget_on_commit((instance.group_id,))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        feed_cache.bump(feed_cache.post_feeds(instance.post))
+
+
+@receiver(post_init, sender=Group)
+def group_loaded(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+def _group_pages_feeds(group_id):
+    """Ленты, где видны название и адрес группы: её посты на главной
+    и на страницах их авторов."""
+    authors = Post.objects.filter(group=group_id).values_list(
+        'author', flat=True).distinct()
+    return {feed_cache.INDEX, feed_cache.group_feed(group_id),
+            *(feed_cache.author_feed(author_id) for author_id in authors)}
+
+
+def _author_pages_feeds(author_id):
+    """Ленты, где видно имя автора: главная, его страница и его группы."""
+    groups = Post.objects.filter(
+        author=author_id, group__isnull=False).values_list(
+        'group', flat=True).distinct()
+    return {feed_cache.INDEX, feed_cache.author_feed(author_id),
+            *(feed_cache.group_feed(group_id) for group_id in groups)}
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    hydration.groups.evict(instance.pk)
+    group_pages.forget_group(instance, instance._loaded_slug)
+    instance._loaded_slug = instance.slug
+    if created:
+        feed_cache.bump((feed_cache.group_feed(instance.pk),))
+    else:
+        feed_cache.bump(_group_pages_feeds(instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты останутся без группы обновлением в SQL, без сигналов.
+    instance._pages_feeds = _group_pages_feeds(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    hydration.groups.evict(instance.pk)
+    group_pages.forget_group(instance)
+    feed_cache.bump(instance._pages_feeds)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    hydration.authors.evict(instance.pk)
+    if created:
+        feed_cache.bump((feed_cache.author_feed(instance.pk),))
+    else:
+        feed_cache.bump(_author_pages_feeds(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    feed_cache.bump((feed_cache.follows_feed(instance.user_id),))
+    if created:
+        timeline.push_posts(instance.user_id, Post.objects.filter(
+            author=instance.author_id))
+
+
+@receiver(post_save, sender=FollowGroup)
+def group_follow_created(sender, instance, created, **kwargs):
+    feed_cache.bump((feed_cache.follows_feed(instance.user_id),))
+    if created:
+        timeline.push_posts(instance.user_id, Post.objects.filter(
+            group=instance.group_id))
+
+
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=FollowGroup)
+def follow_deleted(sender, instance, **kwargs):
+    feed_cache.bump((feed_cache.follows_feed(instance.user_id),))
+    timeline.rebuild(instance.user_id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    hydration.authors.evict(instance.pk)
@@ -0,0 +1,45 @@
+from django import template
+from django.db import transaction
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, size, sizes='100vw', lazy=False):
+    """Картинка с вариантами ширин и форматов для srcset.
+
+    Пока нет запасного варианта, показывает заглушку и ставит картинку
+    в очередь: так миниатюры появятся и у картинок, загруженных до
+    смены вариантов.
+    """
+    ready = thumbnails.cached_variants(image, size) if image else {}
+    fallback = ready.pop(thumbnails.formats()[-1], None)
+    if not fallback:
+        if image:
+            transaction.on_commit(lambda: thumbnails.enqueue(image))
+        return {'placeholder': image and thumbnails.placeholder(size)}
+    return {
+        'sources': [
+            {'type': thumbnails.mime_type(format_),
+             'srcset': _srcset(variants)}
+            for format_, variants in ready.items()
+        ],
+        'src': fallback[-1][1].url,
+        'srcset': _srcset(fallback),
+        'sizes': sizes,
+        'lazy': lazy,
+    }
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{thumbnail.url} {width}w' for width, thumbnail in variants)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, size):
+    """Одним запросом готовит миниатюры всей страницы ленты."""
+    thumbnails.prefetch([post.image for post in posts], size)
+    return ''
@@ -1,15 +1,17 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.forms import PostForm
-from posts.models import Comment, Group, Post
+from posts.models import AuthorStats, Comment, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -160,3 +162,58 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(Comment.objects.filter(
             text='text',
             author=self.user,).exists())
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+        )
+        cls.group_new = Group.objects.create(
+            title='Тестовое название1',
+            slug='slug2',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertCounters(self, author, group, group_new):
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.user).posts_count, author)
+        self.assertEqual(Group.objects.get(
+            pk=self.group.pk).posts_count, group)
+        self.assertEqual(Group.objects.get(
+            pk=self.group_new.pk).posts_count, group_new)
+
+    def test_counters_follow_views(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'group': self.group.pk})
+        post = Post.objects.get()
+        self.assertCounters(1, 1, 0)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Пост', 'group': self.group_new.pk})
+        self.assertCounters(1, 0, 1)
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            data={'text': 'Комментарий'})
+        self.assertEqual(Post.objects.get().comments_count, 1)
+        self.authorized_client.get(
+            reverse('posts:post_delete', args=(post.pk,)))
+        self.assertCounters(0, 0, 0)
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        Comment.objects.create(post=post, author=self.user, text='text')
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.assertCounters(1, 1, 0)
+        self.assertEqual(Post.objects.get().comments_count, 1)
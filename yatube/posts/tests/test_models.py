@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..management.commands.explain_feeds import explain, feed_querysets
+from ..models import Follow, FollowGroup, Group, Post, User
 
 User = get_user_model()
 
@@ -57,3 +59,25 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают индекс без отдельной сортировки."""
+        for name, queryset in feed_querysets(self.user, self.group).items():
+            with self.subTest(name=name):
+                plan = ' '.join(explain(queryset))
+                self.assertIn('INDEX', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follows_are_unique(self):
+        """Повторная подписка запрещена на уровне базы."""
+        author = User.objects.create_user(username='author')
+        follows = (
+            (Follow, {'user': self.user, 'author': author}),
+            (FollowGroup, {'user': self.user, 'group': self.group}),
+        )
+        for model, fields in follows:
+            with self.subTest(model=model.__name__):
+                model.objects.create(**fields)
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        model.objects.create(**fields)
@@ -2,14 +2,26 @@ from django import forms
 from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+import json
+from datetime import timedelta
+import os
 import shutil
+from io import BytesIO, StringIO
 
+from posts import comment_queue, fulltext, hydration, thumbnails
 from posts.forms import PostForm
-from posts.models import Group, Post, Follow
+from posts.models import (AuthorStats, Comment, FollowGroup, Group, Post,
+                          Follow, Timeline)
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 import tempfile
+from unittest import mock, skipUnless
+
+from PIL import Image
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -131,6 +143,26 @@ class PostPagesTests(TestCase):
                 'slug': wrong_group.slug}))
         self.assertEqual(len(response.context['page_obj']), 0)
 
+    def test_thumbnail_placeholder_until_rendered(self):
+        """Пока миниатюра не готова, вместо неё показывается заглушка."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response = self.authorized_client.get(url)
+        self.assertContains(response, thumbnails.placeholder('card').url)
+        thumbnails.render(self.post.image.name)
+        response = self.authorized_client.get(url)
+        self.assertContains(
+            response, thumbnails.cached_thumbnail(self.post.image, 'card').url)
+
+    @override_settings(NPLUSONE_DETECT=True, NPLUSONE_RAISE=True)
+    def test_feed_thumbnails_without_nplusone(self):
+        """Миниатюры ленты ищутся одним запросом на страницу."""
+        for index in range(4):
+            Post.objects.create(author=self.user, text=f'Пост {index}',
+                                image=f'posts/missing_{index}.gif')
+        cache.clear()
+        response = self.authorized_client.get(reverse('posts:posts_index'))
+        self.assertEqual(response.status_code, 200)
+
     def test_cache(self):
         """Тест кэша."""
         post = Post.objects.create(
@@ -141,13 +173,61 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(reverse('posts:posts_index'))
         response_post = response.context['page_obj'][0]
         self.assertEqual(post, response_post)
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='new text')
         response_2 = self.authorized_client.get(reverse('posts:posts_index'))
         self.assertEqual(response.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:posts_index'))
         self.assertNotEqual(response.content, response_3.content)
 
+    def test_cache_invalidation(self):
+        """Сохранение и удаление поста сразу видны в закэшированных лентах."""
+        urls = (
+            reverse('posts:posts_index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        post = Post.objects.create(
+            text='Новый пост',
+            author=self.user,
+            group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url), post.text)
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.authorized_client.get(url), post.text)
+
+    def test_renames_invalidate_other_feeds(self):
+        """Новые название, адрес группы и имя автора сразу видны на
+        главной и на страницах, где показаны их посты."""
+        index = reverse('posts:posts_index')
+        profile = reverse('posts:profile', args=(self.user.username,))
+        self.client.get(index)
+        self.client.get(profile)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.slug = 'new-slug'
+        group.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.username = 'renamed'
+        author.save()
+        response = self.client.get(index)
+        self.assertContains(response, '#Новое название')
+        self.assertContains(response, '/group/new-slug/')
+        self.assertNotContains(response, '/group/test-slug/')
+        self.assertContains(response, '@renamed')
+        self.assertNotContains(response, '@auth<')
+        self.assertContains(
+            self.client.get(reverse('posts:profile', args=('renamed',))),
+            '#Новое название')
+        self.assertContains(
+            self.client.get(reverse('posts:group_list', args=('new-slug',))),
+            '@renamed')
+
 
 class PaginatorViewTest(TestCase):
     @classmethod
@@ -215,6 +295,86 @@ class PaginatorViewTest(TestCase):
                     len(response_second.context['page_obj']
                         ), self.count_post - settings.COUNT_POST)
 
+    def test_cursor_paginators(self):
+        """Курсорная навигация проходит ленту вперёд и назад."""
+        paginators_list = (
+            ('posts:posts_index', None),
+            ('posts:group_list', (self.group.slug,)),
+            ('posts:profile', (self.user.username,)),
+        )
+        for reverse_name, arg in paginators_list:
+            with self.subTest(reverse_name=reverse_name):
+                cache.clear()
+                url = reverse(reverse_name, args=arg)
+                first_page = self.client.get(url).context['page_obj']
+                second_page = self.client.get(
+                    url, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    len(second_page), self.count_post - settings.COUNT_POST)
+                self.assertFalse(second_page.has_next())
+                self.assertNotIn(second_page[0], first_page)
+                previous_page = self.client.get(
+                    url, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(previous_page), list(first_page))
+                self.assertFalse(previous_page.has_previous())
+
+    def test_same_dates_split_by_id(self):
+        """Посты с одной датой не повторяются и не теряются на страницах."""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        url = reverse('posts:posts_index')
+        first_page = self.client.get(url).context['page_obj']
+        numbered = self.client.get(url, {'page': 2}).context['page_obj']
+        cursor = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(list(numbered), list(cursor))
+        self.assertEqual(
+            [post.pk for post in (*first_page, *cursor)],
+            sorted(Post.objects.values_list('pk', flat=True), reverse=True))
+
+    def test_follow_pages_in_timeline_order(self):
+        """Лента подписок листается по дате записи в ленте, а не поста."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        oldest = Post.objects.order_by('pub_date', 'pk')
+        for index, post in enumerate(oldest):
+            Timeline.objects.filter(user=follower, post=post).update(
+                pub_date=post.pub_date - timedelta(days=index))
+        self.client.force_login(follower)
+        url = reverse('posts:follow_index')
+        first_page = self.client.get(url).context['page_obj']
+        numbered = self.client.get(url, {'page': 2}).context['page_obj']
+        cursor = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(list(numbered), list(cursor))
+        self.assertEqual([*first_page, *cursor], list(oldest))
+
+    def test_follow_same_dates_split_by_timeline(self):
+        """Записи ленты подписок с одной датой идут по id записи ленты."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        Timeline.objects.filter(user=follower).delete()
+        posts = list(Post.objects.order_by('-pk'))
+        Timeline.objects.bulk_create(
+            Timeline(user=follower, post=post, pub_date=posts[0].pub_date)
+            for post in posts)
+        self.client.force_login(follower)
+        url = reverse('posts:follow_index')
+        first_page = self.client.get(url).context['page_obj']
+        numbered = self.client.get(url, {'page': 2}).context['page_obj']
+        cursor = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(list(numbered), list(cursor))
+        self.assertEqual([*first_page, *cursor], posts[::-1])
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:posts_index'), {'cursor': 'broken'})
+        self.assertEqual(
+            len(response.context['page_obj']), settings.COUNT_POST)
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -269,3 +429,816 @@ class FollowTests(TestCase):
         follow.delete()
         response_2 = self.follower_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response_2.context['page_obj']), 0)
+
+    def test_author_and_group_follow_without_duplicates(self):
+        """Пост автора из отслеживаемой группы попадает в ленту один раз."""
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='follow-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        FollowGroup.objects.create(user=self.user_follower, group=group)
+        Post.objects.create(
+            text='Пост в группе',
+            author=self.user_following,
+            group=group,
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(TIMELINE_LIMIT=2)
+    def test_rebuild_timelines_respects_limit(self):
+        """Команда rebuild_timelines пересобирает ленту с ограничением."""
+        for index in range(3):
+            Post.objects.create(
+                text=f'Пост {index}',
+                author=self.user_following,
+            )
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertQuerysetEqual(
+            Timeline.objects.filter(user=self.user_follower).values_list(
+                'post__text', flat=True),
+            ('Пост 2', 'Пост 1'),
+            transform=str,
+        )
+
+    @override_settings(TIMELINE_LIMIT=2)
+    def test_timelines_trimmed_in_bulk(self):
+        """Новый пост обрезает ленты всех подписчиков одним DELETE."""
+        followers = [self.user_follower] + [
+            User.objects.create_user(username=f'reader{index}')
+            for index in range(3)
+        ]
+        for follower in followers:
+            Follow.objects.create(user=follower, author=self.user_following)
+        Post.objects.create(text='Второй', author=self.user_following)
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(text='Третий', author=self.user_following)
+        trims = [query['sql'] for query in queries
+                 if query['sql'].startswith('DELETE FROM "posts_timeline"')
+                 and '"pub_date" <=' in query['sql']]
+        self.assertEqual(len(trims), 1)
+        for follower in followers:
+            self.assertQuerysetEqual(
+                Timeline.objects.filter(user=follower).values_list(
+                    'post__text', flat=True),
+                ('Третий', 'Второй'),
+                transform=str,
+            )
+
+    def test_edit_does_not_touch_timelines(self):
+        """Правка текста поста не пересобирает ленты подписчиков."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный текст'
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertFalse(any('posts_timeline' in query['sql']
+                             for query in queries))
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Кот <b>сидит</b> на окне',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пёс номер {index}')
+            for index in range(settings.COUNT_POST + 1)
+        )
+
+    def test_search_highlights_and_escapes(self):
+        """Поиск находит пост и подсвечивает совпадение без XSS."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertContains(response, '<mark>Кот</mark>')
+        self.assertContains(response, '&lt;b&gt;сидит&lt;/b&gt;')
+        self.assertQuerysetEqual(
+            fulltext.filter_posts(Post.objects.all(), 'кот'),
+            (self.post,), transform=lambda post: post)
+
+    def test_search_follows_updates_and_paginates(self):
+        """Индекс обновляется триггерами, выдача разбита на страницы."""
+        Post.objects.filter(pk=self.post.pk).update(text='Пёс на окне')
+        url = reverse('posts:search')
+        self.assertEqual(
+            len(self.client.get(url, {'q': 'кот'}).context['page_obj']), 0)
+        response = self.client.get(url, {'q': 'пёс', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(response, 'q=%D0%BF%D1%91%D1%81&page=1')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DatasetCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_dataset_and_benchmark(self):
+        """Генератор заполняет базу, бенчмарк сохраняет метрики в JSON."""
+        call_command(
+            'generate_dataset', users=20, groups=3, posts=200,
+            comments=100, follows=4, batch_size=50, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Timeline.objects.exists())
+        output = os.path.join(TEMP_MEDIA_ROOT, 'benchmark.json')
+        call_command(
+            'benchmark_views', requests=3, output=output, stdout=StringIO())
+        with open(output) as result_file:
+            views = json.load(result_file)['views']
+        self.assertEqual(set(views), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'})
+        for name, result in views.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+
+class ImportExportCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост, "{index}"',
+                                group=cls.group if index % 2 else None)
+            for index in range(5)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка сохраняют посты, даты и счётчики."""
+        fields = ('author', 'group', 'text', 'pub_date')
+        expected = list(Post.objects.values_list(*fields))
+        for extension in ('ndjson', 'csv'):
+            with self.subTest(format=extension):
+                path = os.path.join(self.directory, f'posts.{extension}')
+                call_command('export_posts', path, stderr=StringIO())
+                Post.objects.all().delete()
+                Timeline.objects.all().delete()
+                AuthorStats.objects.all().delete()
+                call_command('import_posts', path, batch_size=2,
+                             stdout=StringIO())
+                self.assertEqual(
+                    list(Post.objects.values_list(*fields)), expected)
+                self.assertEqual(
+                    Timeline.objects.filter(user=self.reader).count(), 5)
+                self.assertEqual(AuthorStats.objects.get(
+                    user=self.author).posts_count, 5)
+
+    def test_unknown_author_skipped(self):
+        """Строки с неизвестным автором пропускаются с предупреждением."""
+        path = os.path.join(self.directory, 'unknown.ndjson')
+        with open(path, 'w') as source:
+            source.write(json.dumps({'author': 'nobody', 'text': 'x'}) + '\n')
+            source.write(json.dumps({'author': 'auth', 'text': 'y'}) + '\n')
+        errors = StringIO()
+        call_command('import_posts', path, stdout=StringIO(), stderr=errors)
+        self.assertIn('nobody', errors.getvalue())
+        self.assertTrue(Post.objects.filter(text='y').exists())
+        self.assertFalse(Post.objects.filter(text='x').exists())
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ProfileExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {index}')
+            for index in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[3], author=cls.reader, text='Комментарий')
+        cls.url = reverse('posts:profile_export', args=('auth',))
+
+    def test_author_gets_archive(self):
+        """Автор получает все свои посты с комментариями потоком NDJSON."""
+        self.client.force_login(self.author)
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [record['id'] for record in records],
+            [post.pk for post in self.posts])
+        self.assertEqual(records[3]['comments'][0]['text'], 'Комментарий')
+        self.assertEqual(records[0]['comments'], [])
+
+    def test_other_user_redirected(self):
+        """Чужой архив скачать нельзя."""
+        self.client.force_login(self.reader)
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, reverse('posts:profile', args=('auth',)))
+
+
+class SyndicationFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Первый пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [
+            reverse(name, args=args) for name, args in (
+                ('posts:index_rss', ()),
+                ('posts:index_atom', ()),
+                ('posts:group_rss', ('test-slug',)),
+                ('posts:group_atom', ('test-slug',)),
+                ('posts:profile_rss', ('auth',)),
+                ('posts:profile_atom', ('auth',)),
+            )
+        ]
+
+    def test_feeds_conditional_get(self):
+        """Ленты отдают посты и 304 на повторный запрос с ETag."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Первый пост')
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_feeds_invalidated(self):
+        """Новый и удалённый пост сразу видны в закэшированных лентах."""
+        for url in self.urls:
+            self.client.get(url)
+        post = Post.objects.create(
+            author=self.author, text='Второй пост', group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Второй пост')
+        post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Второй пост')
+
+    def test_feed_cached_per_host(self):
+        """Закэшированная лента не отдаёт ссылки чужого хоста."""
+        url = self.urls[0]
+        self.client.get(url, HTTP_HOST='localhost')
+        response = self.client.get(url, HTTP_HOST='127.0.0.1')
+        self.assertContains(response, 'http://127.0.0.1/')
+        self.assertNotContains(response, 'http://localhost/')
+
+    def test_feed_etag_computed_once(self):
+        """ETag ленты с поиском автора считается один раз за запрос."""
+        url = reverse('posts:profile_rss', args=('auth',))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), 1)
+
+    def test_missing_group_feed(self):
+        """Лента несуществующей группы отвечает 404."""
+        response = self.client.get(reverse('posts:group_rss', args=('x',)))
+        self.assertEqual(response.status_code, 404)
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.old_post = Post.objects.create(author=cls.user, text='Старый')
+        cls.new_post = Post.objects.create(author=cls.user, text='Новый')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_comments_raise_post(self):
+        """Комментарии поднимают пост выше более свежего."""
+        url = reverse('posts:trending')
+        self.assertEqual(
+            list(self.client.get(url).context['page_obj']),
+            [self.new_post, self.old_post])
+        for index in range(10):
+            self.client.post(
+                reverse('posts:add_comment', args=(self.old_post.pk,)),
+                {'text': f'Комментарий {index}'})
+        self.assertEqual(
+            list(self.client.get(url).context['page_obj']),
+            [self.old_post, self.new_post])
+
+    def test_update_trending_command(self):
+        """Команда восстанавливает сброшенные оценки."""
+        Post.objects.update(trending_score=0)
+        call_command('update_trending', stdout=StringIO())
+        self.old_post.refresh_from_db()
+        self.assertGreater(self.old_post.trending_score, 0)
+
+
+class PostDetailQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост', group=cls.group)
+        cls.url = reverse('posts:post_detail', args=(cls.post.pk,))
+
+    def test_query_count_is_constant(self):
+        """Число запросов не растёт с комментариями и постами автора."""
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        for index in range(30):
+            Post.objects.create(author=self.user, text=f'Пост {index}')
+            Comment.objects.create(
+                post=self.post, author=self.user, text=f'Комментарий {index}')
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_missing_post_not_found(self):
+        """Несуществующий пост отвечает 404, а не 500."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk + 100,)))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COUNT_COMMENTS=2)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {index}')
+            for index in range(5)
+        ]
+
+    def test_detail_shows_first_comments(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertEqual(response.context['comments'], self.comments[:2])
+        self.assertIsNotNone(response.context['comments_cursor'])
+
+    def test_comments_json_pages(self):
+        """JSON-эндпоинт отдаёт оставшиеся комментарии порциями."""
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        cursor = ''
+        received = []
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            received += [comment['id'] for comment in data['comments']]
+            cursor = data['next']
+        self.assertEqual(
+            received, [comment.pk for comment in self.comments])
+
+    def test_comments_json_missing_post(self):
+        """Для несуществующего поста эндпоинт отвечает 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:posts_index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без тела."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_etag_changes(self):
+        """ETag меняется с новым постом, страницей и подпиской."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(self.client.get(url)['ETag'], etags[url])
+        url = self.urls[0]
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.client.get(url, {'page': 2})['ETag'])
+        self.client.force_login(self.reader)
+        etag = self.client.get(self.urls[2])['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertNotEqual(self.client.get(self.urls[2])['ETag'], etag)
+
+    def test_profile_author_loaded_once(self):
+        """ETag и страница автора берут автора одним запросом."""
+        url = self.urls[2]
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(
+            sum('FROM "auth_user"' in query['sql'] for query in queries), 1)
+
+    def test_missing_group_not_found(self):
+        """Для несуществующей группы по-прежнему 404."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENT_WRITE_BEHIND=True, COMMENT_BATCH_SECONDS=None)
+class CommentWriteBehindTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.url = reverse('posts:post_detail', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue_dir = directory.name
+        # Подмешивание ожидающих комментариев работает только с общим кэшем.
+        settings_override = override_settings(
+            COMMENT_QUEUE_DIR=directory.name,
+            CACHES={'default': {
+                **settings.CACHES['default'],
+                'BACKEND': 'core.cache_backends.SharedFileBasedCache',
+                'LOCATION': os.path.join(directory.name, 'cache'),
+            }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def comment(self, text='Комментарий'):
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': text})
+
+    def texts(self, client):
+        return [comment.text
+                for comment in client.get(self.url).context['comments']]
+
+    def test_comment_visible_to_author_before_flush(self):
+        """До сброса комментарий видит только автор, в базе его нет."""
+        self.comment()
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.texts(self.client), ['Комментарий'])
+        reader = Client()
+        reader.force_login(self.reader)
+        self.assertEqual(self.texts(reader), [])
+
+    def test_flush_saves_batch(self):
+        """Сброс сохраняет пачку со счётчиком и убирает её из кэша."""
+        for index in range(3):
+            self.comment(f'Комментарий {index}')
+        self.assertEqual(comment_queue.flush(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual(
+            self.texts(self.client),
+            [f'Комментарий {index}' for index in range(3)])
+        self.assertIsNone(
+            cache.get(comment_queue.pending_key(self.post.pk, self.user.pk)))
+
+    def test_saved_comment_not_shown_twice(self):
+        """Уже сохранённая запись из кэша не дублирует комментарий."""
+        self.comment()
+        key = comment_queue.pending_key(self.post.pk, self.user.pk)
+        records = cache.get(key)
+        comment_queue.flush()
+        cache.set(key, records)
+        self.assertEqual(self.texts(self.client), ['Комментарий'])
+
+    def test_process_local_cache_without_overlay(self):
+        """С кэшем в памяти процесса очередь не подмешивается."""
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.comment()
+            self.assertIsNone(cache.get(
+                comment_queue.pending_key(self.post.pk, self.user.pk)))
+            self.assertEqual(self.texts(self.client), [])
+            comment_queue.flush()
+            self.assertEqual(self.texts(self.client), ['Комментарий'])
+
+    def test_replayed_batch_not_duplicated(self):
+        """Повторная обработка пачки после сбоя не создаёт дублей."""
+        self.comment()
+        journal = os.path.join(self.queue_dir, comment_queue.JOURNAL)
+        with open(journal) as journal_file:
+            records = journal_file.read()
+        comment_queue.flush()
+        with open(os.path.join(self.queue_dir, 'batch-0.ndjson'),
+                  'w') as batch:
+            batch.write(records + '{"post": ')
+        out = StringIO()
+        with self.assertLogs('posts.comment_queue', 'WARNING'):
+            call_command('flush_comments', stdout=out)
+        self.assertIn('Сохранено комментариев: 0', out.getvalue())
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertNotIn('batch-0.ndjson', os.listdir(self.queue_dir))
+
+
+@override_settings(COUNT_POST=2, GROUP_FEED_PAGES=2)
+class GroupPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {index}', group=cls.group)
+            for index in range(6)
+        ]
+        # Число постов группы берётся из счётчика, который ведут
+        # представления, а посты здесь созданы напрямую.
+        call_command('reconcile_counters', stdout=StringIO())
+        cls.url = reverse('posts:group_list', args=(cls.group.slug,))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def page(self, number=1, url=None):
+        response = self.client.get(url or self.url, {'page': number})
+        return list(response.context['page_obj'])
+
+    def test_cached_page_in_one_query(self):
+        """Готовая страница: один запрос за постами, без группы и COUNT."""
+        # Без общего кэша пользователь сессии читается из базы.
+        self.client.logout()
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[:-3:-1])
+        self.assertEqual(response.context['posts_count'], 6)
+
+    def test_list_rebuilt_without_count(self):
+        """Список собирается без COUNT(*), число постов — из счётчика."""
+        other = Client()
+        for client, expected in ((self.client, 6), (other, 0)):
+            with self.subTest(expected=expected):
+                url = (self.url if expected else reverse(
+                    'posts:group_list', args=(self.other_group.slug,)))
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(response.context['posts_count'], expected)
+                self.assertFalse(any('COUNT(' in query['sql']
+                                     for query in queries))
+
+    def test_pages_follow_changes(self):
+        """Новый, перенесённый и удалённый пост сразу видны в ленте."""
+        self.page()
+        new_post = Post.objects.create(
+            author=self.user, text='Новый', group=self.group)
+        self.assertEqual(self.page(), [new_post, self.posts[-1]])
+        new_post.group = self.other_group
+        new_post.save()
+        self.assertEqual(self.page(), self.posts[:-3:-1])
+        self.assertEqual(
+            self.page(url=reverse('posts:group_list',
+                                  args=(self.other_group.slug,))),
+            [new_post])
+        self.client.get(
+            reverse('posts:post_delete', args=(self.posts[-1].pk,)))
+        self.assertEqual(self.page(), self.posts[-2:-4:-1])
+        self.assertEqual(
+            self.client.get(self.url).context['posts_count'], 5)
+
+    def test_rolled_back_post_not_listed(self):
+        """После отката транзакции в готовом списке нет чужих id."""
+        self.page()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(
+                author=self.user, text='Откат', group=self.group)
+            raise RuntimeError
+        self.assertEqual(self.page(), self.posts[:-3:-1])
+        self.assertEqual(
+            self.client.get(self.url).context['posts_count'], 6)
+
+    def test_pages_beyond_window(self):
+        """Страницы за окном готовых читаются из базы."""
+        self.assertEqual(self.page(3), self.posts[1::-1])
+
+    def test_follow_button_per_user(self):
+        """Кнопка подписки своя у каждого пользователя."""
+        self.assertFalse(self.client.get(self.url).context['followin'])
+        FollowGroup.objects.create(user=self.user, group=self.group)
+        self.assertTrue(self.client.get(self.url).context['followin'])
+        self.assertFalse(Client().get(self.url).context['followin'])
+
+
+class HydrationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            User.objects.create_user(username=f'author{index}')
+            for index in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for index in range(6):
+            Post.objects.create(author=cls.authors[index % 3],
+                                text=f'Пост {index}', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        hydration.authors.clear()
+        hydration.groups.clear()
+
+    def test_feed_without_joins(self):
+        """Лента читает посты без JOIN, авторов и группы — по запросу."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:posts_index'))
+        sql = [query['sql'] for query in queries]
+        self.assertFalse(any('JOIN' in statement for statement in sql))
+        self.assertEqual(
+            sum('FROM "auth_user"' in statement for statement in sql), 1)
+        self.assertEqual(
+            sum('FROM "posts_group"' in statement for statement in sql), 1)
+        for post in response.context['page_obj']:
+            self.assertEqual(post.author, self.authors[int(post.text[-1]) % 3])
+            self.assertEqual(post.group, self.group)
+
+    def test_identity_map_reused(self):
+        """Повторная сборка берёт авторов и группы из карты."""
+        hydration.hydrate(Post.objects.all())
+        with self.assertNumQueries(1):
+            posts = hydration.hydrate(Post.objects.all())
+            self.assertEqual(posts[0].author.username, 'author2')
+        self.assertIs(posts[0].author, posts[3].author)
+
+    def test_changes_evict(self):
+        """Изменение автора и истечение срока убирают объект из карты."""
+        hydration.hydrate(Post.objects.all())
+        author = User.objects.get(username='author2')
+        author.username = 'renamed'
+        author.save()
+        posts = hydration.hydrate(Post.objects.filter(author=author))
+        self.assertEqual(posts[0].author.username, 'renamed')
+        hydration.authors.clear()
+        with override_settings(HYDRATION_TTL=0):
+            hydration.hydrate(Post.objects.all())
+            with self.assertNumQueries(2):
+                hydration.hydrate(Post.objects.all())
+
+    def test_evict_reaches_other_processes(self):
+        """Сброс в одном процессе очищает карты остальных через кэш."""
+        author = self.authors[0]
+        other = hydration.IdentityMap(User)
+        other.get_many({author.pk})
+        User.objects.filter(pk=author.pk).update(username='renamed')
+        hydration.authors.evict(author.pk)
+        self.assertEqual(other.get_many({author.pk})[author.pk].username,
+                         'renamed')
+
+    @override_settings(HYDRATION_MAX_OBJECTS=2)
+    def test_overflow_evicts_oldest(self):
+        """При переполнении уходят самые старые записи, а не вся карта."""
+        first, second, third = (author.pk for author in self.authors)
+        hydration.authors.get_many({first})
+        hydration.authors.get_many({second})
+        hydration.authors.get_many({third})
+        with self.assertNumQueries(0):
+            hydration.authors.get_many({second, third})
+        with self.assertNumQueries(1):
+            hydration.authors.get_many({first})
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResponsiveImagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        cls.photo = BytesIO()
+        Image.new('RGB', (1200, 800), (200, 80, 40)).save(
+            cls.photo, 'JPEG', exif=exif.tobytes())
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост с фото', image=SimpleUploadedFile(
+                'photo.jpg', cls.photo.getvalue(), content_type='image/jpeg'))
+        thumbnails.render(cls.post.image.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_srcset_in_card_and_detail(self):
+        """Лента и страница поста отдают все ширины через srcset."""
+        for url in (reverse('posts:posts_index'),
+                    reverse('posts:post_detail', args=(self.post.pk,))):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '<img', count=2)
+                for variant in thumbnails.variants('card'):
+                    self.assertContains(response, f' {variant.width}w')
+        self.assertContains(
+            self.client.get(reverse('posts:posts_index')), 'loading="lazy"')
+
+    def test_variants_without_metadata(self):
+        """Варианты нужных размеров и без EXIF."""
+        for variant in thumbnails.variants('card'):
+            with self.subTest(variant=variant[:2]):
+                ready = thumbnails.cached_variants(
+                    self.post.image, 'card')[variant.format]
+                url = dict(ready)[variant.width].url
+                path = os.path.join(
+                    TEMP_MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+                with Image.open(path) as image:
+                    self.assertEqual(
+                        '%dx%d' % image.size, variant.geometry)
+                    self.assertNotIn('exif', image.info)
+
+    def test_rendered_thumbnails_refresh_feed(self):
+        """Заглушка ставит картинку в очередь, а готовые варианты
+        обновляют закэшированную ленту."""
+        post = Post.objects.create(
+            author=self.user, text='Новое фото', image=SimpleUploadedFile(
+                'new.jpg', self.photo.getvalue(), content_type='image/jpeg'))
+        url = reverse('posts:posts_index')
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue, \
+                mock.patch('posts.templatetags.post_thumbnails.transaction.'
+                           'on_commit', side_effect=lambda func: func()):
+            response = self.client.get(url)
+        self.assertContains(response, thumbnails.placeholder('card').url)
+        enqueue.assert_called_once_with(post.image)
+        thumbnails.render(post.image.name)
+        response = self.client.get(url)
+        self.assertNotContains(response, thumbnails.placeholder('card').url)
+        self.assertContains(
+            response, thumbnails.cached_thumbnail(post.image, 'card').url)
+
+    @skipUnless('WEBP' in thumbnails.formats(), 'Pillow без поддержки WebP')
+    def test_webp_source(self):
+        """При поддержке WebP браузеру предлагается и он."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_benchmark_images_command(self):
+        """Бенчмарк считает байты на страницу ленты по образцам."""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'photo.jpg'), 'wb') as sample:
+                sample.write(self.photo.getvalue())
+            out = StringIO()
+            call_command('benchmark_images', directory, stdout=out)
+        self.assertIn('JPEG 320w', out.getvalue())
+        self.assertIn('КБ на страницу', out.getvalue())
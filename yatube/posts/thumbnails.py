@@ -0,0 +1,290 @@
+"""Фоновая подготовка миниатюр для картинок постов.
+
+После сохранения поста картинка ставится в очередь локального пула
+потоков, который заранее рендерит все размеры из ``POST_THUMBNAILS``.
+Шаблоны берут только готовые миниатюры из хранилища sorl-thumbnail и,
+пока их нет, показывают заглушку, поэтому запрос никогда не ресайзит
+картинку сам.
+
+Каждый размер готовится в нескольких ширинах (``POST_THUMBNAIL_WIDTHS``)
+и форматах (``POST_THUMBNAIL_FORMATS``) для ``srcset``: WebP, если его
+умеет сохранять установленный Pillow, и запасной JPEG. Движок ``Engine``
+не переносит в миниатюры EXIF, XMP и ICC-профиль.
+"""
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+from threading import Lock
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connections
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.engines.pil_engine import Engine as PilEngine
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDbKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from . import feed_cache
+from .models import Post
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    # Pillow собран без LittleCMS.
+    ImageCms = None
+
+logger = logging.getLogger(__name__)
+
+Placeholder = namedtuple('Placeholder', ('url', 'width', 'height'))
+Variant = namedtuple('Variant', ('format', 'width', 'geometry', 'options'))
+
+_executor = None
+_pending = set()
+_failed = set()
+_futures = set()
+_deferred = []
+_lock = Lock()
+
+
+def _to_srgb(image, icc_profile):
+    if ImageCms is None:
+        return None
+    try:
+        return ImageCms.profileToProfile(
+            image, ImageCms.ImageCmsProfile(BytesIO(icc_profile)),
+            ImageCms.createProfile('sRGB'), outputMode=image.mode)
+    except (ImageCms.PyCMSError, OSError, ValueError):
+        return None
+
+
+class Engine(PilEngine):
+    """Движок sorl, который сохраняет миниатюры без метаданных.
+
+    Цвета из встроенного ICC-профиля сначала переводятся в sRGB, иначе
+    без профиля картинка выглядела бы блёклой; если перевести нельзя,
+    профиль остаётся в файле.
+    """
+
+    def _get_raw_data(self, image, format_, quality, image_info=None,
+                      progressive=False):
+        icc_profile = (image_info or {}).get('icc_profile')
+        kept = {}
+        if icc_profile:
+            converted = _to_srgb(image, icc_profile)
+            if converted is None:
+                kept['icc_profile'] = icc_profile
+            else:
+                image = converted
+        return super()._get_raw_data(
+            image, format_, quality, image_info=kept, progressive=progressive)
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд, который только ищет готовую миниатюру и не создаёт её."""
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+    def full_options(self, source, options):
+        """Опции миниатюры с умолчаниями sorl, как при её создании."""
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        options = self.full_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+_backend = CachedThumbnailBackend()
+
+
+def _dimensions(geometry):
+    return tuple(int(side) for side in geometry.split('x'))
+
+
+def placeholder(size):
+    geometry, _ = settings.POST_THUMBNAILS[size]
+    width, height = _dimensions(geometry)
+    svg = (f'<svg xmlns="http://www.w3.org/2000/svg" '
+           f'viewBox="0 0 {width} {height}">'
+           f'<rect width="100%" height="100%" fill="#e9ecef"/></svg>')
+    return Placeholder(
+        f'data:image/svg+xml,{quote(svg, safe="")}', width, height)
+
+
+def formats():
+    """Форматы вариантов, которые умеет сохранять Pillow; последний — запасной.
+
+    Pillow без libwebp не пишет WebP, тогда остаётся только JPEG.
+    """
+    Image.init()
+    return [format_ for format_ in settings.POST_THUMBNAIL_FORMATS
+            if format_ in Image.SAVE]
+
+
+def mime_type(format_):
+    return f'image/{EXTENSIONS[format_].replace("jpg", "jpeg")}'
+
+
+def variants(size):
+    """Все варианты размера ``size`` по форматам и ширинам, от узких."""
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = _dimensions(geometry)
+    widths = sorted({width, *(
+        variant_width for variant_width in settings.POST_THUMBNAIL_WIDTHS
+        if variant_width < width)})
+    return [
+        Variant(format_, variant_width,
+                f'{variant_width}x{round(height * variant_width / width)}',
+                {**options, 'format': format_,
+                 'quality': settings.POST_THUMBNAIL_QUALITY})
+        for format_ in formats() for variant_width in widths
+    ]
+
+
+def cached_variants(image, size):
+    """Готовые варианты картинки: {формат: [(ширина, миниатюра), ...]}."""
+    # На странице ленты записи уже в кэше, prefetch их не перечитывает.
+    prefetch([image], size)
+    ready = {}
+    for variant in variants(size):
+        thumbnail = _backend.get_cached_thumbnail(
+            image, variant.geometry, **variant.options)
+        if thumbnail is not None:
+            ready.setdefault(variant.format, []).append(
+                (variant.width, thumbnail))
+    return ready
+
+
+def cached_thumbnail(image, size):
+    """Готовая миниатюра размера ``size`` в запасном формате или None."""
+    variant = [variant for variant in variants(size)
+               if variant.format == formats()[-1]][-1]
+    return _backend.get_cached_thumbnail(
+        image, variant.geometry, **variant.options)
+
+
+def prefetch(images, size):
+    """Поднимает в кэш записи о миниатюрах пачки картинок.
+
+    Без этого хранилище sorl на промахе кэша читает базу отдельным
+    запросом на каждую карточку ленты.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return
+    keys = [
+        add_prefix(_backend.thumbnail_file(
+            image, variant.geometry, **variant.options).key)
+        for image in images if image
+        for variant in variants(size)
+    ]
+    missing = set(keys) - set(kvstore.cache.get_many(keys))
+    if not missing:
+        return
+    values = dict(KVStoreModel.objects.filter(
+        key__in=missing).values_list('key', 'value'))
+    kvstore.cache.set_many(
+        {key: values.get(key, EMPTY_VALUE) for key in missing},
+        sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+
+def encode(name, data, geometry, options, engine=None):
+    """Байты миниатюры, как их записал бы sorl, без хранилища (бенчмарки)."""
+    engine = engine or default.engine
+    image = engine.get_image(BytesIO(data))
+    options = _backend.full_options(ImageFile(name), dict(options))
+    options['image_info'] = engine.get_image_info(image)
+    thumbnail = engine.create(image, parse_geometry(
+        geometry, engine.get_image_ratio(image, options)), options)
+    return engine._get_raw_data(
+        thumbnail, options['format'], options['quality'],
+        image_info=options['image_info'],
+        progressive=options.get(
+            'progressive', sorl_settings.THUMBNAIL_PROGRESSIVE))
+
+
+def render(name):
+    """Синхронно рендерит все варианты всех размеров для картинки.
+
+    Закэшированные фрагменты лент с этой картинкой показывали заглушку,
+    поэтому версии лент её постов увеличиваются.
+    """
+    for size in settings.POST_THUMBNAILS:
+        for variant in variants(size):
+            get_thumbnail(name, variant.geometry, **variant.options)
+    feeds = set()
+    for post in Post.objects.filter(image=name).only('author', 'group'):
+        feeds |= feed_cache.post_feeds(post)
+    feed_cache.bump(feeds)
+
+
+def _render_job(name, close_connections=True):
+    try:
+        render(name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры для %s', name)
+        with _lock:
+            # Битую картинку не рендерим заново на каждый показ ленты.
+            _failed.add(name)
+    finally:
+        if close_connections:
+            connections.close_all()
+        with _lock:
+            _pending.discard(name)
+
+
+def enqueue(image):
+    """Ставит картинку в очередь на подготовку миниатюр.
+
+    При ``POST_THUMBNAIL_WORKERS = 0`` фонового пула нет: задачи ждут
+    вызова ``join``.
+    """
+    global _executor
+    if not image:
+        return
+    with _lock:
+        if image.name in _pending or image.name in _failed:
+            return
+        _pending.add(image.name)
+        if not settings.POST_THUMBNAIL_WORKERS:
+            _deferred.append(image.name)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        future = _executor.submit(_render_job, image.name)
+        _futures.add(future)
+    future.add_done_callback(_futures.discard)
+
+
+def join():
+    """Дожидается всех поставленных задач (для тестов)."""
+    with _lock:
+        futures = list(_futures)
+        deferred = _deferred[:]
+        _deferred.clear()
+    wait(futures)
+    for name in deferred:
+        _render_job(name, close_connections=False)
@@ -0,0 +1,97 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Записи ``Timeline`` раскладываются по читателям в момент публикации поста
+и при изменении подписок, поэтому ``follow_index`` читает ленту одним
+проходом по индексу ``(user, pub_date)`` без объединений и дублей.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Follow, FollowGroup, Post, Timeline, User
+
+# Читателей на один DELETE: SQLite ограничивает глубину выражения.
+TRIM_BATCH_SIZE = 500
+
+
+def _followers(post):
+    users = set(Follow.objects.filter(
+        author=post.author_id).values_list('user', flat=True))
+    if post.group_id:
+        users.update(FollowGroup.objects.filter(
+            group=post.group_id).values_list('user', flat=True))
+    return users
+
+
+def trim(user_ids):
+    """Оставляет каждому читателю не больше TIMELINE_LIMIT записей.
+
+    На пачку читателей — один запрос за границами лент и один DELETE.
+    """
+    limit = settings.TIMELINE_LIMIT
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+        boundaries = User.objects.filter(
+            pk__in=user_ids[start:start + TRIM_BATCH_SIZE],
+        ).annotate(boundary=Subquery(
+            Timeline.objects.filter(user=OuterRef('pk')).order_by(
+                '-pub_date').values('pub_date')[limit:limit + 1]),
+        ).exclude(boundary=None).values_list('pk', 'boundary')
+        conditions = [Q(user=user_id, pub_date__lte=boundary)
+                      for user_id, boundary in boundaries]
+        if conditions:
+            Timeline.objects.filter(reduce(or_, conditions)).delete()
+
+
+def push_post(post):
+    """Раскладывает пост по лентам подписчиков автора и группы."""
+    users = _followers(post)
+    Timeline.objects.filter(post=post).exclude(user__in=users).delete()
+    Timeline.objects.bulk_create(
+        (Timeline(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in users),
+        ignore_conflicts=True,
+    )
+    trim(users)
+
+
+def push_posts(user_id, posts):
+    """Добавляет в ленту читателя свежие посты новой подписки."""
+    posts = posts.order_by('-pub_date').values_list('pk', 'pub_date')
+    Timeline.objects.bulk_create(
+        (Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts[:settings.TIMELINE_LIMIT]),
+        ignore_conflicts=True,
+    )
+    trim((user_id,))
+
+
+@transaction.atomic
+def rebuild(user_id):
+    """Пересобирает ленту читателя по его текущим подпискам."""
+    # IN-подзапросы вместо объединений: без дублей и DISTINCT, а SQLite
+    # идёт по индексу pub_date и останавливается на TIMELINE_LIMIT.
+    Timeline.objects.filter(user=user_id).delete()
+    push_posts(user_id, Post.objects.filter(
+        Q(author__in=Follow.objects.filter(
+            user=user_id).values('author'))
+        | Q(group__in=FollowGroup.objects.filter(
+            user=user_id).values('group'))))
+
+
+def rebuild_followers(author_ids, group_ids):
+    """Пересобирает ленты всех подписчиков авторов и групп.
+
+    Для массовой загрузки постов: bulk_create не вызывает сигналы,
+    а раскладывать посты по одному слишком долго.
+    """
+    users = Follow.objects.filter(author__in=author_ids).values_list(
+        'user', flat=True).union(FollowGroup.objects.filter(
+            group__in=group_ids).values_list('user', flat=True))
+    users = list(users)
+    for user_id in users:
+        rebuild(user_id)
+    return len(users)
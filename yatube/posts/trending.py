@@ -0,0 +1,36 @@
+"""Рейтинг «Популярное»: комментарии с затуханием по времени.
+
+Оценка — ``log10(комментарии) + возраст / TRENDING_DECAY_SECONDS``:
+в десять раз больше комментариев весит столько же, сколько
+TRENDING_DECAY_SECONDS свежести. Время входит в оценку через дату
+публикации, а не через «сейчас», поэтому старые оценки не устаревают
+и пересчитывать пост нужно только при новом комментарии, а лента
+читается обратным проходом по индексу ``trending_score``.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .models import Post
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def score(comments_count, pub_date):
+    return (math.log10(max(comments_count, 1))
+            + (pub_date - EPOCH).total_seconds()
+            / settings.TRENDING_DECAY_SECONDS)
+
+
+def refresh(posts):
+    """Пересчитывает оценки постов из queryset по их текущим данным."""
+    updated = []
+    for post in posts.only(
+            'comments_count', 'pub_date', 'trending_score').order_by():
+        new_score = score(post.comments_count, post.pub_date)
+        if post.trending_score != new_score:
+            post.trending_score = new_score
+            updated.append(post)
+    Post.objects.bulk_update(updated, ('trending_score',))
+    return len(updated)
@@ -1,8 +1,210 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
 from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .feed_queries import ordered
+from .hydration import hydrate
+from .models import Comment
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(obj, direction=NEXT, field='pub_date', tiebreak='pk'):
+    """Непрозрачный токен позиции записи в ленте по (дата, id)."""
+    raw = (f'{direction}|{getattr(obj, field).isoformat()}'
+           f'|{getattr(obj, tiebreak)}')
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбор токена; для битого токена возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(
+            token + '=' * (-len(token) % 4)).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    ``field`` — поле или аннотация с датой, по которой идёт лента,
+    ``tiebreak`` — уникальный ключ, разделяющий записи с одной датой.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 tiebreak='pk'):
+        self.field = field
+        self.tiebreak = tiebreak
+        super().__init__(ordered(object_list, field, tiebreak), per_page)
+
+    def get_page(self, cursor):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._page(self.object_list, '', NEXT, first=True)
+        return self._page(self.page_posts(*decoded), cursor, decoded[0])
+
+    def page_posts(self, direction, pub_date, pk):
+        """Выборка страницы после записи курсора или перед ней."""
+        field, tiebreak = self.field, self.tiebreak
+        if direction == NEXT:
+            return self.object_list.filter(
+                Q(**{f'{field}__lt': pub_date})
+                | Q(**{field: pub_date, f'{tiebreak}__lt': pk}))
+        return self.object_list.filter(
+            Q(**{f'{field}__gt': pub_date})
+            | Q(**{field: pub_date, f'{tiebreak}__gt': pk})
+        ).order_by(field, tiebreak)
+
+    def _page(self, posts, cursor, direction, first=False):
+        rows = list(posts[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            return CursorPage(rows, self, cursor, has_next=True,
+                              has_previous=has_more)
+        return CursorPage(rows, self, cursor, has_next=has_more,
+                          has_previous=not first)
+
 
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, cursor,
+                 has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
 
-def paginator(request, posts_list):
-    paginator = Paginator(posts_list, settings.COUNT_POST)
+    def __repr__(self):
+        return f'<Cursor page {self.cursor}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return encode_cursor(
+                self.object_list[-1], NEXT, self.paginator.field,
+                self.paginator.tiebreak)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return encode_cursor(
+                self.object_list[0], PREVIOUS, self.paginator.field,
+                self.paginator.tiebreak)
+        return None
+
+
+def paginator(request, posts_list, cursor=True, pages=None,
+              field='pub_date', tiebreak='pk'):
+    """Постраничный вывод ленты.
+
+    Без параметра ``cursor`` работает обычная нумерация страниц,
+    а ссылка «Следующая» переводит на курсорную навигацию,
+    которой не нужны COUNT(*) и OFFSET на глубоких страницах.
+    Обе навигации идут в порядке (``field``, ``tiebreak``) от новых
+    к старым.
+    Для выборок не по дате (поиск) курсор отключается и порядок
+    остаётся за выборкой. ``pages`` — свой паджинатор для нумерованных
+    страниц с тем же порядком.
+    Авторы и группы постов страницы подставляются через hydration,
+    поэтому выборке не нужен select_related.
+    """
+    if cursor and 'cursor' in request.GET:
+        page = CursorPaginator(
+            posts_list, settings.COUNT_POST, field, tiebreak
+        ).get_page(request.GET.get('cursor'))
+        page.object_list = hydrate(page.object_list)
+        return page
+    if cursor:
+        posts_list = ordered(posts_list, field, tiebreak)
+    if pages is None:
+        pages = Paginator(posts_list, settings.COUNT_POST)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page = pages.get_page(page_number)
+    page.object_list = hydrate(page.object_list)
+    if cursor and page.has_next():
+        page.next_cursor = encode_cursor(page[-1], NEXT, field, tiebreak)
+    return page
+
+
+def comments_page(comments, cursor=None):
+    """Порция комментариев после курсора по (created, id) и курсор дальше."""
+    comments = comments.order_by('created', 'pk')
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is not None:
+        _, created, pk = decoded
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk))
+    rows = list(comments[:settings.COUNT_COMMENTS + 1])
+    if len(rows) <= settings.COUNT_COMMENTS:
+        return rows, None
+    rows = rows[:settings.COUNT_COMMENTS]
+    return rows, encode_cursor(rows[-1], field='created')
+
+
+@contextmanager
+def manual_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def posts_archive(posts, build_url, chunk_size):
+    """Строки NDJSON с постами и их комментариями.
+
+    Посты читаются через iterator(), комментарии — одним запросом
+    на пачку постов, поэтому память не зависит от размера архива.
+    """
+    posts = posts.select_related('group').order_by('pk').iterator(
+        chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(posts, chunk_size))
+        if not chunk:
+            return
+        comments = defaultdict(list)
+        for comment in Comment.objects.filter(
+                post__in=[post.pk for post in chunk]).select_related(
+                'author').order_by('created', 'pk'):
+            comments[comment.post_id].append({
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+            })
+        for post in chunk:
+            yield json.dumps({
+                'id': post.pk,
+                'text': post.text,
+                'pub_date': post.pub_date.isoformat(),
+                'group': post.group.slug if post.group else None,
+                'image': build_url(post.image.url) if post.image else None,
+                'comments': comments[post.pk],
+            }, ensure_ascii=False) + '\n'
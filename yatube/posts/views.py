@@ -1,64 +1,173 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.views.decorators.http import condition
 
+from . import (comment_queue, counters, feed_cache, feed_queries, fulltext,
+               group_pages, thumbnails, trending)
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User, FollowGroup
-from .utils import paginator
-from django.db.models import Q
+from .utils import comments_page, paginator, posts_archive
 
 
+def index_etag(request):
+    return feed_cache.etag(request, feed_cache.INDEX)
+
+
+def _group(request, slug):
+    return feed_cache.per_request(
+        request, 'group', lambda: group_pages.get_group(slug))
+
+
+def _author(request, username):
+    return feed_cache.per_request(
+        request, 'author', lambda: User.objects.select_related(
+            'stats').filter(username=username).first())
+
+
+def group_etag(request, slug):
+    group = _group(request, slug)
+    if group is None:
+        return None
+    return feed_cache.etag(request, feed_cache.group_feed(group.pk))
+
+
+def profile_etag(request, username):
+    author = _author(request, username)
+    if author is None:
+        return None
+    return feed_cache.etag(request, feed_cache.author_feed(author.pk))
+
+
+@condition(etag_func=index_etag)
 def index(request):
-    posts_list = Post.objects.select_related('group', 'author').all()
     context = {
-        'page_obj': paginator(request, posts_list),
+        'page_obj': paginator(request, feed_queries.index()),
+        'feed_version': feed_cache.version(feed_cache.INDEX, request),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=index_etag)
+def trending_index(request):
+    # Комментарии меняют версию главной ленты, а от них зависит рейтинг.
+    context = {
+        'page_obj': paginator(
+            request, feed_queries.trending(), cursor=False),
+        'feed_version': feed_cache.version(feed_cache.INDEX, request),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'trending': True,
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.select_related('author').all()
-    followin = request.user.is_authenticated and group.followin.filter(
-        user=request.user).exists()
+    group = _group(request, slug)
+    if group is None:
+        raise Http404('Группа не найдена')
+    posts_list = feed_queries.group(group)
+    pages = group_pages.GroupPaginator(group, posts_list)
     context = {
         'group': group,
-        'page_obj': paginator(request, posts_list),
-        'followin': followin
+        'page_obj': paginator(request, posts_list, pages=pages),
+        'posts_count': pages.count,
+        'followin': group.pk in group_pages.followed(request.user),
+        'feed_version': feed_cache.version(
+            feed_cache.group_feed(group.pk), request),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group').all()
+    author = _author(request, username)
+    if author is None:
+        raise Http404('Автор не найден')
     following = request.user.is_authenticated and author.following.filter(
         user=request.user).exists()
     context = {
         'author': author,
-        'page_obj': paginator(request, post_list),
-        'following': following
+        'page_obj': paginator(request, feed_queries.profile(author)),
+        'following': following,
+        'feed_version': feed_cache.version(
+            feed_cache.author_feed(author.pk), request),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+def profile_export(request, username):
+    if request.user.username != username:
+        return redirect('posts:profile', username)
+    response = StreamingHttpResponse(
+        posts_archive(request.user.posts.all(), request.build_absolute_uri,
+                      settings.EXPORT_CHUNK_SIZE),
+        content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{username}-posts.ndjson"')
+    return response
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+    if query:
+        context['page_obj'] = paginator(
+            request, fulltext.search(query), cursor=False)
+    return render(request, 'posts/search.html', context)
+
+
 def post_detail(request, post_id):
-    post = Post.objects.get(pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     form = CommentForm()
-    comments = post.comments.select_related('author').all()
+    comments, comments_cursor = comments_page(
+        post.comments.select_related('author'), request.GET.get('comments'))
+    if settings.COMMENT_WRITE_BEHIND and comments_cursor is None:
+        comments += comment_queue.pending(post.pk, request.user)
     context = {
         'post': post,
         'comments': comments,
+        'comments_cursor': comments_cursor,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments, cursor = comments_page(
+        post.comments.select_related('author'), request.GET.get('cursor'))
+    if settings.COMMENT_WRITE_BEHIND and cursor is None:
+        comments += comment_queue.pending(post.pk, request.user)
+    return JsonResponse({
+        'comments': [{
+            'id': comment.pk,
+            'author': comment.author.username,
+            'text': comment.text,
+            'created': comment.created.isoformat(),
+            'html': render_to_string(
+                'includes/comment.html', {'comment': comment}),
+        } for comment in comments],
+        'next': cursor,
+    })
+
+
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post.pk,)
-    post.delete()
+    with transaction.atomic():
+        post.delete()
+        counters.post_deleted(post)
     return redirect('posts:profile', post.author)
 
 
@@ -68,7 +177,10 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        form.save()
+        with transaction.atomic():
+            form.save()
+            counters.post_created(post)
+            transaction.on_commit(lambda: thumbnails.enqueue(post.image))
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -78,12 +190,18 @@ def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post.pk,)
+    old_group_id = post.group_id
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            form.save()
+            counters.post_moved(old_group_id, post)
+            if 'image' in form.changed_data:
+                transaction.on_commit(
+                    lambda: thumbnails.enqueue(post.image))
         return redirect('posts:post_detail', post.pk)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -96,17 +214,21 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        if settings.COMMENT_WRITE_BEHIND:
+            comment_queue.enqueue(comment)
+        else:
+            with transaction.atomic():
+                comment.save()
+                counters.comment_added(comment)
+                trending.refresh(Post.objects.filter(pk=post.pk))
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related('author', 'group').filter(
-        Q(author__following__user=request.user)
-        | Q(group__followin__user=request.user))
-#   post_list = Post.objects.filter(author__in=follow_list.values('author'))
-    context = {'page_obj': paginator(request, post_list)}
+    context = {'page_obj': paginator(
+        request, feed_queries.follow(request.user),
+        **feed_queries.FOLLOW_ORDER)}
     return render(request, 'posts/follow.html', context)
 
 
@@ -131,9 +253,7 @@ def profile_unfollow(request, username):
 @login_required
 def group_follow(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    if not FollowGroup.objects.filter(user=request.user, group=group).exists():
-        new_follow = FollowGroup(user=request.user, group=group)
-        new_follow.save()
+    FollowGroup.objects.get_or_create(user=request.user, group=group)
     return redirect('posts:group_list', slug=slug)
 
 
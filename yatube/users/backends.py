@@ -0,0 +1,47 @@
+"""Авторизация без запроса к базе на каждой странице.
+
+AuthenticationMiddleware на каждом запросе ищет пользователя по id из
+сессии. Бэкенд кладёт найденного пользователя в кэш, а сигналы
+сбрасывают запись при выходе, смене пароля и любом сохранении
+пользователя, поэтому проверка хэша сессии идёт по актуальному паролю.
+
+Сброс доходит до всех воркеров только через общий кэш. С кэшем в памяти
+процесса (LocMemCache, DummyCache) бэкенд ничего не кэширует и работает
+как обычный ModelBackend: иначе другой воркер ещё долго пускал бы по
+старому паролю или отключённого пользователя.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.db_routers import use_primary
+
+
+def cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def forget(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def shared_cache():
+    """Общий ли кэш по умолчанию для всех процессов."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        if not shared_cache():
+            return super().get_user(user_id)
+        key = cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # С реплики в кэш мог бы попасть пользователь со старым паролем.
+            with use_primary():
+                user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
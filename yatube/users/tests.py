@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+User = get_user_model()
+
+CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={'default': {
+    **settings.CACHES['default'],
+    'BACKEND': 'core.cache_backends.SharedFileBasedCache',
+    'LOCATION': CACHE_DIR,
+}})
+class CachedAuthTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='auth', password='old-password-123')
+        self.client.force_login(self.user)
+
+    def auth_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [
+            query['sql'] for query in queries
+            if 'django_session' in query['sql'] or 'auth_user' in query['sql']
+        ]
+
+    def test_hot_path_without_auth_queries(self):
+        """Повторный запрос не читает из базы ни сессию, ни пользователя."""
+        url = reverse('about:author')
+        self.client.get(url)
+        response, queries = self.auth_queries(url)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(queries, [])
+
+    def test_password_change_invalidates_other_sessions(self):
+        """После смены пароля старые сессии разлогиниваются."""
+        url = reverse('about:author')
+        self.client.get(url)
+        self.user.set_password('new-password-456')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_password_change_view_keeps_session(self):
+        """Смена пароля через форму оставляет текущую сессию живой."""
+        self.client.post(reverse('users:password_change'), {
+            'old_password': 'old-password-123',
+            'new_password1': 'new-password-456',
+            'new_password2': 'new-password-456',
+        })
+        response = self.client.get(reverse('about:author'))
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertTrue(response.context['user'].check_password(
+            'new-password-456'))
+
+    def test_logout_forgets_user(self):
+        """Выход удаляет пользователя из кэша."""
+        self.client.get(reverse('about:author'))
+        self.assertIsNotNone(cache.get(f'auth_user:{self.user.pk}'))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(f'auth_user:{self.user.pk}'))
+
+    def test_session_of_model_backend_kept(self):
+        """Сессии, выданные до кэширующего бэкенда, не разлогиниваются."""
+        self.client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('about:author'))
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_login_uses_cached_backend(self):
+        """Новый вход записывает в сессию кэширующий бэкенд."""
+        self.client.logout()
+        self.client.login(username='auth', password='old-password-123')
+        self.assertEqual(self.client.session['_auth_user_backend'],
+                         'users.backends.CachedModelBackend')
+
+    def test_process_local_cache_not_used(self):
+        """С кэшем в памяти процесса пользователь не кэшируется."""
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.client.get(reverse('about:author'))
+            self.assertIsNone(cache.get(f'auth_user:{self.user.pk}'))
@@ -30,6 +30,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,7 +46,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -67,6 +70,32 @@ DATABASES = {
     }
 }
 
+# PRAGMA для каждого соединения с SQLite (см. core/sqlite.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Отрицательное значение — размер в КиБ: 64 МиБ страничного кэша.
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Файлы реплик для чтения, например
+# [os.path.join(BASE_DIR, 'replica.sqlite3')]; наполняются командой
+# sync_replicas. В тестах реплики смотрят в тестовую основную базу.
+REPLICA_DB_FILES = []
+for index, name in enumerate(REPLICA_DB_FILES, 1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной базы.
+REPLICA_PIN_SECONDS = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,6 +130,44 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 COUNT_POST = 10
 
+COUNT_COMMENTS = 20
+# Сколько секунд свежести весят столько же, сколько
+# десятикратный рост числа комментариев в ленте «Популярное».
+TRENDING_DECAY_SECONDS = 60 * 60 * 12
+# Сколько последних постов отдавать в RSS и Atom.
+SYNDICATION_ITEMS = 20
+# Сколько постов читать за раз при выгрузке архива автора.
+EXPORT_CHUNK_SIZE = 500
+# Отложенная запись комментариев пачками (posts.comment_queue).
+# При COMMENT_BATCH_SECONDS = None фоновый поток не запускается и
+# очередь сбрасывает только команда flush_comments.
+COMMENT_WRITE_BEHIND = False
+COMMENT_QUEUE_DIR = os.environ.get(
+    'YATUBE_COMMENT_QUEUE_DIR', os.path.join(BASE_DIR, 'comment_queue'))
+COMMENT_QUEUE_FSYNC = True
+COMMENT_BATCH_SECONDS = 0.5
+COMMENT_BATCH_SIZE = 200
+
+TIMELINE_LIMIT = 1000
+# Сколько первых страниц ленты каждой группы держать готовыми в кэше.
+GROUP_FEED_PAGES = 5
+# Сколько секунд авторы и группы лент живут в карте идентичности процесса.
+HYDRATION_TTL = 60
+HYDRATION_MAX_OBJECTS = 10_000
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 3
+
+# Сессии и пользователь читаются из кэша, база — только на промахе.
+# Пользователь кэшируется только в общем кэше (YATUBE_CACHE_DIR).
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# ModelBackend остаётся в списке для сессий, выданных до кэширующего
+# бэкенда: Django ищет бэкенд сессии по пути из списка.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = 60 * 15
+
 LOGIN_URL = 'users:login'
 LOGOUT_URL = 'users:logout'
 LOGIN_REDIRECT_URL = 'posts:posts_index'
@@ -117,8 +184,43 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Потоки фонового рендера миниатюр; 0 — рендер только по join() (тесты).
+POST_THUMBNAIL_WORKERS = 2
+# Ширины вариантов для srcset (не больше ширины размера) и форматы:
+# последний — запасной для браузеров без поддержки остальных.
+POST_THUMBNAIL_WIDTHS = (320, 640)
+POST_THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+POST_THUMBNAIL_QUALITY = 80
+THUMBNAIL_ENGINE = 'posts.thumbnails.Engine'
+
+
+# Кэш, общий для всех процессов: каталог на диске. Без переменной
+# окружения — кэш в памяти процесса (разработка и тесты).
+CACHE_DIR = os.environ.get('YATUBE_CACHE_DIR', '')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': ('core.cache_backends.SharedFileBasedCache' if CACHE_DIR
+                    else 'core.cache_backends.InstrumentedLocMemCache'),
+        'LOCATION': CACHE_DIR,
+        # Пространство имён: несколько сайтов или окружений в одном кэше.
+        'KEY_PREFIX': os.environ.get('YATUBE_CACHE_PREFIX', 'yatube'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50_000,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
     }
 }
+
+REQUEST_METRICS_SLOW_MS = 500
+REQUEST_METRICS_MAX_QUERIES = 50
+
+# Поиск N+1: сколько SELECT одной формы за запрос считать подозрительным.
+# В DEBUG находки пишутся в лог, pytest и manage.py test включают
+# падение тестов.
+NPLUSONE_DETECT = DEBUG
+NPLUSONE_RAISE = False
+NPLUSONE_THRESHOLD = 3
+TEST_RUNNER = 'core.test_runner.NPlusOneTestRunner'